@@ -27,10 +27,78 @@ def outer(A, B):
     return C.reshape(np.shape(A) + np.shape(B))
 
 
+_basis_cache = {}
+_subdivision_cache = {}
+
+
+def bernstein(n, t):
+    """Bernstein basis of degree n evaluated at every value of t,
+    shape len(t) x (n + 1):
+        >>> bernstein(2, [0, .5, 1])
+        array([[1.  , 0.  , 0.  ],
+               [0.25, 0.5 , 0.25],
+               [0.  , 0.  , 1.  ]])
+    """
+    t = np.asarray(t, dtype=float).reshape(-1, 1)
+    k = np.arange(n + 1)
+    coefs = np.ones(n + 1)
+    for i in xrange(1, n + 1):
+        coefs[i] = coefs[i - 1] * (n - i + 1) / i
+    return coefs * t ** k * (1. - t) ** (n - k)
+
+
+def bernstein_column(n, i, t):
+    """Single Bernstein polynomial B_i of degree n evaluated at t."""
+    t = np.asarray(t, dtype=float)
+    coef = 1.
+    for k in xrange(min(i, n - i)):
+        coef = coef * (n - k) / (k + 1)
+    return coef * t ** i * (1. - t) ** (n - i)
+
+
+def bernstein_basis(n, m):
+    """Cached Bernstein basis of degree n over np.linspace(0, 1, m). Entries are
+    only ever added, so threads may share the cache without a lock."""
+    key = (n, m)
+    cached = _basis_cache.get(key)
+    if cached is None:
+        t = np.linspace(0, 1, m)
+        cached = _basis_cache[key] = (t, bernstein(n, t))
+    return cached
+
+
+def basis(n, t):
+    """Bernstein basis at t, taken from cache when t is a uniform grid."""
+    t = np.asarray(t, dtype=float)
+    if t.ndim == 1 and len(t) > 1 and t[0] == 0 and t[-1] == 1:
+        grid, B = bernstein_basis(n, len(t))
+        if np.array_equal(grid, t):
+            return B
+    return bernstein(n, t)
+
+
+def homogeneous(p, weights=None):
+    """Control points p (shape (n+1) x 2) lifted to homogeneous coordinates (w*x, w*y, w)."""
+    p = np.asarray(p, dtype=float)
+    w = np.ones(len(p)) if weights is None else np.asarray(weights, dtype=float)
+    return np.hstack((p * w[:, None], w[:, None]))
+
+
+def evaluate(t, p, weights=None):
+    """Rational bezier curve with control points p (shape (n+1) x 2) at values t.
+    Returns homogeneous points, shape len(t) x 3."""
+    pw = homogeneous(p, weights)
+    return basis(len(pw) - 1, t).dot(pw)
+
+
 def casteljau(t, p, by=None, weights=None):
     t = np.asarray(t)
     p = np.asarray(p)
 
+    if by is None:
+        h = evaluate(t.ravel(), p.T, weights)
+        return (h[:, :2] / h[:, 2, None]).reshape(np.shape(t) + (2,))
+
     n = np.shape(p)[-1] - 1  # number of parameters
     if weights is None:
         w = outer(np.ones(np.shape(t)), np.ones(np.shape(p)))
@@ -40,9 +108,8 @@ def casteljau(t, p, by=None, weights=None):
         w = outer(np.ones(np.shape(t)), np.vstack((w, w)))
 
     b = outer(np.ones(np.shape(t)), p)
-    if by is not None:
-        _coefs = []
-        _coefs_w = []
+    _coefs = []
+    _coefs_w = []
     x = outer(1. - t, np.ones(np.shape(p[..., 0])))
     y = outer(t, np.ones(np.shape(p[..., 0])))
 
@@ -51,33 +118,298 @@ def casteljau(t, p, by=None, weights=None):
             w_i = x * w[..., i] + y * w[..., i+1]
             b[..., i] = x * w[..., i] / w_i * b[..., i] + y * w[..., i+1] / w_i * b[..., i+1]
             w[..., i] = w_i
-            if by:
-                _coefs.append(tuple(b[by, :, i]))
-                _coefs_w.append(w[by, 0, i])
-    if by:
-        return b[..., 0], _coefs, _coefs_w
-    return b[..., 0]
+            _coefs.append(tuple(b[by, :, i]))
+            _coefs_w.append(w[by, 0, i])
+    return b[..., 0], _coefs, _coefs_w
+
+
+def casteljau_batch(t, ps, weights=None):
+    """Evaluate many rational bezier curves at the same values t in one pass.
+    ps is a sequence of control polygons (each (n+1) x 2, degrees may differ),
+    weights an optional sequence of matching weight vectors. Curves are grouped
+    by degree and every group is evaluated with one tensor product.
+    Returns a list of len(t) x 2 arrays in the order of ps; polygons with
+    less than two points are returned as they are."""
+    ps = [np.asarray(p, dtype=float) for p in ps]
+    weights = [None] * len(ps) if weights is None else weights
+    result = [None] * len(ps)
+
+    groups = {}
+    for i, p in enumerate(ps):
+        if len(p) < 2:
+            result[i] = p
+        else:
+            groups.setdefault(len(p), []).append(i)
+
+    for size, idxes in groups.items():
+        pw = np.array([homogeneous(ps[i], weights[i]) for i in idxes])
+        h = np.einsum('md,gdk->gmk', basis(size - 1, t), pw)
+        h = h[..., :2] / h[..., 2, None]
+        for i, curve_points in zip(idxes, h):
+            result[i] = curve_points
+    return result
+
+
+def subdivision_matrices(n, t=.5):
+    """Matrices L, R mapping the n+1 control points of a bezier curve
+    to the control points of its parts over [0, t] and [t, 1]. Only halving
+    is cached, per degree, other cuts rarely repeat."""
+    if t == .5 and n in _subdivision_cache:
+        return _subdivision_cache[n]  # only ever added, safe to share between threads
+    L = np.zeros((n + 1, n + 1))
+    R = np.zeros((n + 1, n + 1))
+    for j in xrange(n + 1):
+        L[j, :j + 1] = bernstein(j, t)
+        R[j, j:] = bernstein(n - j, t)
+    if t == .5:
+        _subdivision_cache[n] = L, R
+    return L, R
+
+
+def flatness(pw):
+    """Largest distance of control points from the chord of every segment, the
+    segment between its end points and not the line through them, so that
+    overshooting an end counts. pw are homogeneous control points of shape
+    segments x (n+1) x 3."""
+    p = pw[..., :2] / pw[..., 2, None]
+    a, b = p[:, :1, :], p[:, -1:, :]
+    chord = b - a
+    length2 = (chord ** 2).sum(axis=-1)
+    d = p - a
+    u = np.clip((d * chord).sum(axis=-1) / np.maximum(length2, 1e-24), 0, 1)
+    return np.sqrt(((d - u[..., None] * chord) ** 2).sum(axis=-1)).max(axis=-1)
+
+
+def flatten_batch(ps, weights=None, tolerance=.5, max_depth=16):
+    """Adaptive flattening of many rational bezier curves: segments are halved
+    until their control polygon lies within tolerance of the chord, which by the
+    convex hull property bounds the deviation of the curve from the polyline.
+    Every subdivision level of every group of equal degree is one array operation.
+    Returns a list of (t, points) pairs in the order of ps."""
+    ps = [np.asarray(p, dtype=float) for p in ps]
+    weights = [None] * len(ps) if weights is None else weights
+    result = [None] * len(ps)
+
+    groups = {}
+    for i, p in enumerate(ps):
+        if len(p) < 2:
+            result[i] = np.zeros(len(p)), p
+        else:
+            groups.setdefault(len(p), []).append(i)
+
+    for size, idxes in groups.items():
+        L, R = subdivision_matrices(size - 1)
+        segs = np.array([homogeneous(ps[i], weights[i]) for i in idxes])
+        ids = np.arange(len(idxes))
+        t0, t1 = np.zeros(len(idxes)), np.ones(len(idxes))
+        done = []
+        for depth in xrange(max_depth + 1):
+            flat = flatness(segs) <= tolerance if depth < max_depth else np.ones(len(segs), dtype=bool)
+            done.append((ids[flat], t0[flat], t1[flat], segs[flat]))
+            rest = ~flat
+            if not rest.any():
+                break
+            segs, ids, t0, t1 = segs[rest], ids[rest], t0[rest], t1[rest]
+            mid = (t0 + t1) / 2
+            segs = np.concatenate((np.einsum('jk,gkc->gjc', L, segs), np.einsum('jk,gkc->gjc', R, segs)))
+            ids = np.concatenate((ids, ids))
+            t0, t1 = np.concatenate((t0, mid)), np.concatenate((mid, t1))
+
+        ids, t0, t1, segs = [np.concatenate(a) for a in zip(*done)]
+        order = np.lexsort((t0, ids))
+        ids, t1, segs = ids[order], t1[order], segs[order]
+        ends = segs[:, -1, :2] / segs[:, -1, 2, None]
+        bounds = np.searchsorted(ids, np.arange(len(idxes) + 1))
+        for k, i in enumerate(idxes):
+            lo, hi = bounds[k], bounds[k + 1]
+            start = segs[lo, 0, :2] / segs[lo, 0, 2]
+            result[i] = np.concatenate(([0.], t1[lo:hi])), np.vstack((start, ends[lo:hi]))
+    return result
+
+
+def flatten(p, weights=None, tolerance=.5):
+    """Adaptive flattening of a single curve, see flatten_batch."""
+    return flatten_batch([p], [weights], tolerance)[0]
+
+
+def derivatives(t, p, w=None):
+    """Points, first and second derivatives of the rational bezier curve
+    with control points p (shape (n+1) x 2) at values t."""
+    pw = homogeneous(p, w)
+    n = len(pw) - 1
+    d1 = n * np.diff(pw, axis=0)
+    d2 = (n - 1) * np.diff(d1, axis=0)
+    h = bernstein(n, t).dot(pw)
+    h1 = bernstein(n - 1, t).dot(d1) if n > 0 else np.zeros_like(h)
+    h2 = bernstein(n - 2, t).dot(d2) if n > 1 else np.zeros_like(h)
+    c = h[:, :2] / h[:, 2, None]
+    c1 = (h1[:, :2] - c * h1[:, 2, None]) / h[:, 2, None]
+    c2 = (h2[:, :2] - 2 * c1 * h1[:, 2, None] - c * h2[:, 2, None]) / h[:, 2, None]
+    return c, c1, c2
+
+
+def speed(t, p, w=None):
+    """Length of the first derivative of the curve at values t."""
+    pw = homogeneous(p, w)
+    n = len(pw) - 1
+    h = bernstein(n, t).dot(pw)
+    h1 = bernstein(n - 1, t).dot(n * np.diff(pw, axis=0))
+    c1 = (h1[:, :2] - h[:, :2] / h[:, 2, None] * h1[:, 2, None]) / h[:, 2, None]
+    return np.sqrt((c1 ** 2).sum(axis=1))
+
+
+def gauss_legendre(a, b, order=5):
+    """Nodes (one row per interval) and weights of the Gauss-Legendre rule of
+    order on every interval [a, b]."""
+    x, w = np.polynomial.legendre.leggauss(order)
+    half = (np.asarray(b, dtype=float) - a)[..., None] / 2
+    return np.asarray(a, dtype=float)[..., None] + half * (x + 1), half * w
+
+
+def arc_length_table(p, w=None, segments=64):
+    """Parameters t of segments equal steps and the arc length s of the curve
+    up to each of them. The speed is integrated by Gauss-Legendre quadrature
+    over every step, which is exact far below pixel size for smooth curves."""
+    t = np.linspace(0, 1, segments + 1)
+    if len(p) < 2:
+        return t, np.zeros(len(t))
+    nodes, gw = gauss_legendre(t[:-1], t[1:])
+    steps = (speed(nodes.ravel(), p, w).reshape(nodes.shape) * gw).sum(axis=1)
+    return t, np.concatenate(([0.], np.cumsum(steps)))
+
+
+def t_at_length(lengths, table, p, w=None, iterations=3):
+    """Parameters at which the arc length of the curve reaches lengths, table is
+    its arc_length_table. Lengths are interpolated in the table, then refined by
+    Newton steps on the arc length measured from the start of their step."""
+    t, s = table
+    scalar = not np.ndim(lengths)
+    lengths = np.clip(np.atleast_1d(np.asarray(lengths, dtype=float)), 0, s[-1])
+    u = np.interp(lengths, s, t)
+    if len(p) < 2 or s[-1] <= 0:
+        return u[0] if scalar else u
+    k = np.clip(np.searchsorted(s, lengths, side='right') - 1, 0, len(t) - 2)
+    for _ in xrange(iterations):
+        nodes, gw = gauss_legendre(t[k], u)
+        f = s[k] + (speed(nodes.ravel(), p, w).reshape(nodes.shape) * gw).sum(axis=1) - lengths
+        v = speed(u, p, w)
+        u = np.clip(u - np.where(v > 0, f / np.where(v > 0, v, 1), 0), t[k], t[k + 1])
+    return u[0] if scalar else u
+
+
+def arc_length_samples(p, w=None, spacing=1., table=None):
+    """(t, points) of the curve at equal steps of arc length, no longer than spacing."""
+    p = np.asarray(p, dtype=float)
+    if len(p) < 2:
+        return np.zeros(len(p)), p
+    table = table if table is not None else arc_length_table(p, w)
+    total = table[1][-1]
+    t = t_at_length(np.linspace(0, total, max(1, int(np.ceil(total / spacing - 1e-9))) + 1), table, p, w)
+    t[0], t[-1] = 0., 1.
+    h = evaluate(t, p, w)
+    return t, h[:, :2] / h[:, 2, None]
+
+
+def project(q, p, w=None, depth=8, iterations=8):
+    """Parameter t and distance of the point of the curve closest to q.
+    Parts of the curve whose control polygon bounding box is farther from q
+    than the best end point found so far are discarded while halving it
+    depth times, then Newton's method refines every surviving part."""
+    q = np.asarray(q, dtype=float)
+    pw = homogeneous(p, w)
+    n = len(pw) - 1
+    if n < 1:
+        return 0., np.sqrt(((pw[0, :2] / pw[0, 2] - q) ** 2).sum())
+
+    L, R = subdivision_matrices(n)
+    segs, t0, t1 = pw[None], np.zeros(1), np.ones(1)
+    best = np.inf
+    for _ in xrange(depth):
+        pts = segs[..., :2] / segs[..., 2, None]
+        ends = np.sqrt(((pts[:, [0, -1]] - q) ** 2).sum(axis=-1))
+        best = min(best, ends.min())
+        gap = np.maximum(np.maximum(pts.min(axis=1) - q, q - pts.max(axis=1)), 0)
+        keep = np.sqrt((gap ** 2).sum(axis=1)) <= best
+        segs, t0, t1 = segs[keep], t0[keep], t1[keep]
+        mid = (t0 + t1) / 2
+        segs = np.concatenate((np.einsum('jk,gkc->gjc', L, segs), np.einsum('jk,gkc->gjc', R, segs)))
+        t0, t1 = np.concatenate((t0, mid)), np.concatenate((mid, t1))
+
+    t = np.concatenate(([0., 1.], (t0 + t1) / 2))
+    for _ in xrange(iterations):
+        c, c1, c2 = derivatives(t, p, w)
+        f = ((c - q) * c1).sum(axis=1)
+        df = (c1 ** 2).sum(axis=1) + ((c - q) * c2).sum(axis=1)
+        step = np.where(df > 0, f / np.where(df > 0, df, 1), 0)
+        t = np.clip(t - step, 0, 1)
+    h = evaluate(t, p, w)
+    dist = np.sqrt(((h[:, :2] / h[:, 2, None] - q) ** 2).sum(axis=1))
+    k = dist.argmin()
+    return t[k], dist[k]
+
+
+def subdivide(p, t, w=None):
+    """Cuts the rational bezier curve with control points p (shape (n+1) x 2)
+    at parameter t, or at every value of a sequence t, in a single pass.
+    Cuts must lie in (0, 1), repeated ones are cut once.
+    Returns the list of pieces as (control points, weights) pairs."""
+    cuts = np.unique(np.asarray(t, dtype=float))
+    if not len(cuts) or cuts[0] <= 0 or cuts[-1] >= 1:
+        raise ValueError('cuts must lie in (0, 1), got {}'.format(t))
+    pw = homogeneous(p, w)
+    n = len(pw) - 1
+    pieces = []
+    start = 0.
+    for cut in cuts:
+        L, R = subdivision_matrices(n, (cut - start) / (1. - start))
+        pieces.append(L.dot(pw))
+        pw = R.dot(pw)
+        start = cut
+    pieces.append(pw)
+    return [(q[:, :2] / q[:, 2, None], q[:, 2]) for q in pieces]
 
 
 def split_bezier(t, p, by, w=None):
-    _, coefs, coefs_w = casteljau(t, p.T, by, weights=w)
-    left_curve = [p[0, :]]
-    right_curve = []
-    n = len(p) - 1
-    for a in np.split(coefs, np.cumsum(range(n, 0, -1)))[:-1]:
-        left_curve.append(a[0])
-        right_curve.append(a[-1])
-    right_curve = right_curve[::-1] + [p[-1, :]]
-
-    left_w = []
-    right_w = []
-    if w is not None:
-        left_w.append(w[0])
-        for a in np.split(coefs_w, np.cumsum(range(n, 0, -1)))[:-1]:
-            left_w.append(a[0])
-            right_w.append(a[-1])
-        right_w = right_w[::-1] + [w[-1]]
-    return np.asarray(left_curve), np.asarray(right_curve), np.asarray(left_w), np.asarray(right_w)
+    (left_curve, left_w), (right_curve, right_w) = subdivide(p, t[by], w)
+    if w is None:
+        left_w, right_w = [], []
+    return left_curve, right_curve, np.asarray(left_w), np.asarray(right_w)
+
+
+def monotone_chain(points):
+    """Indices of the convex hull vertices of points (Andrew's monotone chain),
+    counterclockwise starting from the lowest x."""
+    order = np.lexsort((points[:, 1], points[:, 0])).tolist()
+    xy = points.tolist()
+
+    def chain(idxes):
+        hull = []
+        for i in idxes:
+            x, y = xy[i]
+            while len(hull) > 1:
+                (ax, ay), (bx, by) = xy[hull[-2]], xy[hull[-1]]
+                if (ax - x) * (by - y) - (ay - y) * (bx - x) > 0:
+                    break
+                hull.pop()
+            hull.append(i)
+        return hull
+
+    lower, upper = chain(order), chain(order[::-1])
+    return lower[:-1] + upper[:-1]
+
+
+def convex_hull(points, qhull_from=64):
+    """Closed polygon of the convex hull of points, computed with the monotone
+    chain for small inputs and with Qhull from qhull_from points on."""
+    points = np.asarray(points, dtype=float)
+    if len(points) < 3:
+        return points
+    if len(points) < qhull_from:
+        vertices = monotone_chain(points)
+    else:
+        from scipy.spatial import ConvexHull  # slow to import, so only loaded once a large hull is needed
+        vertices = ConvexHull(points).vertices.tolist()
+    return points[vertices + vertices[:1], :]
 
 
 def degree_elevation(p, w=None):
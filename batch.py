@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Headless processing of curve files, run as: bezier_editor.py batch [options] files..."""
+import argparse
+import os
+import sys
+from multiprocessing import Pool, cpu_count
+
+import numpy as np
+from curve import Curve, compute_curves
+from store import CurveStore
+from csv_format import read_csv
+from parallel import EvaluationPool
+
+
+def process(curves, split=None, elevate=0, reduce=0):
+    """Applies the batch operations to curves, split pieces follow their curve."""
+    if split is not None:
+        curves = [piece for c in curves
+                  for piece in ([c] + c.split([split]) if len(c.control_points) > 1 else [c])]
+    for c in curves:
+        for _ in xrange(elevate):
+            c.degree_elevation()
+        for _ in xrange(reduce):
+            c.degree_reduction()
+    return curves
+
+
+def process_file(job, pool=None):
+    """Reads, processes and writes one file, returns the name of the output.
+    Curves are evaluated on pool, a parallel.EvaluationPool, if there is one."""
+    file_name, options = job
+    store = CurveStore()
+    # deferred: split, elevate and reduce only mark curves stale, they are evaluated once below if at all
+    curves = [Curve(control_points=points, weights=weights, compute=False, store=store, deferred=True)
+              for points, weights in read_csv(file_name)]
+    curves = process(curves, options['split'], options['elevate'], options['reduce'])
+
+    if options['samples']:
+        compute_curves(curves, n=options['samples'], pool=pool)
+        arr = np.vstack([np.column_stack([np.full(len(c.curve_points), i), c.curve_points])
+                         for i, c in enumerate(curves)] or [np.zeros((0, 3))])
+    else:
+        idx, points, weights = store.export([c.slot for c in curves])
+        arr = np.column_stack([idx, points, weights])
+
+    out = os.path.join(options['output'], os.path.basename(file_name))
+    np.savetxt(out, arr, delimiter=',')
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='bezier_editor.py batch',
+                                     description='Process csv curve files without the editor.')
+    parser.add_argument('files', nargs='+', help='csv files with rows of curve, x, y[, weight]')
+    parser.add_argument('-o', '--output', default='.', help='directory for the processed files')
+    parser.add_argument('--split', type=float, help='split every curve at this parameter')
+    parser.add_argument('--elevate', type=int, default=0, help='degree elevations per curve')
+    parser.add_argument('--reduce', type=int, default=0, help='degree reductions per curve')
+    parser.add_argument('--samples', type=int, default=0,
+                        help='write this many curve samples per curve instead of control points')
+    parser.add_argument('-j', '--jobs', type=int, default=cpu_count(), help='worker processes')
+    args = parser.parse_args(argv)
+    if args.split is not None and not 0 < args.split < 1:
+        parser.error('--split must lie between 0 and 1')
+
+    if not os.path.isdir(args.output):
+        os.makedirs(args.output)
+    # several files are processed one per process, a single one is sharded across them
+    options = {'output': args.output, 'split': args.split, 'elevate': args.elevate, 'reduce': args.reduce,
+               'samples': args.samples}
+    jobs = [(file_name, options) for file_name in args.files]
+    if len(jobs) == 1:
+        pool = EvaluationPool(args.jobs) if args.jobs > 1 else None
+        try:
+            print(process_file(jobs[0], pool))
+        finally:
+            if pool is not None:
+                pool.close()
+        return 0
+    pool = Pool(max(1, min(args.jobs, len(jobs))))
+    try:
+        for out in pool.imap_unordered(process_file, jobs):
+            print(out)
+    finally:
+        pool.close()
+        pool.join()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,31 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Compares building a QPolygonF point by point with filling its buffer from numpy:
+
+    python benchmarks/poly_conversion.py
+"""
+import os
+import sys
+import timeit
+
+import numpy as np
+from PyQt4.QtGui import QPolygonF
+from PyQt4.QtCore import QPointF
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+from canvas import Canvas  # noqa
+
+
+def per_point(pts):
+    return QPolygonF(map(lambda p: QPointF(*p), pts))
+
+
+if __name__ == '__main__':
+    for n in (10, 100, 1000, 10000):
+        pts = np.random.rand(n, 2) * 800
+        assert [(p.x(), p.y()) for p in Canvas.poly(pts)] == [tuple(p) for p in pts]
+        number = max(10, 100000 // n)
+        old = min(timeit.repeat(lambda: per_point(pts), number=number, repeat=3)) / number
+        new = min(timeit.repeat(lambda: Canvas.poly(pts), number=number, repeat=3)) / number
+        print('{:>6} points: per point {:9.1f} us, buffer {:7.1f} us, {:6.1f}x'.format(n, old * 1e6, new * 1e6,
+                                                                                        old / new))
@@ -3,11 +3,6 @@
 
 import sys
 import os
-from PyQt4 import QtGui
-
-from main_window import MainWindow
-from signals import Signals
-from contex import Context
 
 
 def read_css(name):
@@ -17,6 +12,19 @@ def read_css(name):
 
 
 if __name__ == '__main__':
+    if sys.argv[1:2] == ['batch']:
+        import batch  # headless, no Qt needed
+        sys.exit(batch.main(sys.argv[2:]))
+
+    from startup import timings
+    if '--startup-profile' in sys.argv:
+        sys.argv.remove('--startup-profile')
+        timings.enable()
+
+    from PyQt4 import QtGui
+    from main_window import MainWindow
+    from signals import Signals
+    from contex import Context
 
     app = QtGui.QApplication(sys.argv)
 
@@ -26,6 +34,12 @@ if __name__ == '__main__':
     context = Context(signals)
 
     mw = MainWindow(context, signals)
-    mw.setStyleSheet(read_css(os.path.join("themes", "algae", "style.css")))
+    app.aboutToQuit.connect(mw.main_widget.shutdown)
+    with timings.measure('widget', 'style sheet'):
+        mw.setStyleSheet(read_css(os.path.join("themes", "algae", "style.css")))
+
+    if timings.enabled:
+        timings.disable()
+        timings.report()
 
     sys.exit(app.exec_())
@@ -1,10 +1,20 @@
 from PyQt4.QtGui import QWidget, QPolygonF, QPainter, QPen, QBrush, QColor, \
-    QVBoxLayout, QPalette, QPixmap, QCursor
-from PyQt4.QtCore import Qt, QRectF, QPointF
+    QVBoxLayout, QPalette, QPixmap, QCursor, QTransform
+from PyQt4.QtCore import Qt, QRect, QRectF, QPointF, QTimer
 import numpy as np
-from curve import Curve
+from curve import Curve, PARALLEL_MIN_CURVES
+from csv_format import read_csv_chunks
+import document
+from store import CurveStore
+from spatial import ControlPointIndex, EndpointIndex
+from recompute import RecomputeWorker
+from parallel import EvaluationPool
 from tools import Tools
-from itertools import chain
+
+
+def to_qtransform(m):
+    """QTransform of a 3x3 affine matrix acting on column vectors."""
+    return QTransform(m[0, 0], m[1, 0], m[0, 1], m[1, 1], m[0, 2], m[1, 2])
 
 
 class Canvas(QWidget):
@@ -12,8 +22,14 @@ class Canvas(QWidget):
         QWidget.__init__(self, parent)
 
         self.curves = []
+        self.rows = {}  # curve -> its index in curves
+        self.store = CurveStore()
         self.curve = None
+        self.points_index = ControlPointIndex()
+        self.end_points = EndpointIndex()
         self.high_light_points = []
+        self.background = None  # inactive curves, see render_background
+        self.curve_rects = {}  # curve -> screen rect it covered when last damaged
 
         self.context = context
         self.signals = signals
@@ -25,6 +41,11 @@ class Canvas(QWidget):
 
         self.setLayout(main_layout)
         self.tracking = None
+        self.previewing = False  # curve shows preview samples until the tracking ends
+        self.motion = None  # latest mouse position not yet passed to tracking
+        self.motion_timer = QTimer(self)
+        self.motion_timer.setSingleShot(True)
+        self.motion_timer.timeout.connect(self.flush_motion)
 
         self.signals.hull_selection.connect(self.update_curve)
         self.signals.update_color.connect(self.update_curve)
@@ -32,75 +53,224 @@ class Canvas(QWidget):
         self.signals.update_tool.connect(self.update_cursor)
         self.signals.change_curve.connect(self.set_current_curve)
         self.signals.delete_curves.connect(self.delete_curves)
-        self.signals.change_weight.connect(self.change_weight)
         self.signals.add_curve_to_backend.connect(self.add_curve)
+        self.signals.update_tolerance.connect(self.update_tolerance)
+        self.signals.update_spacing.connect(self.update_spacing)
+        self.signals.curves_computed.connect(self.apply_samples)
+        self.pool = None  # started by evaluate_later once there are enough curves to share
+        self.worker = RecomputeWorker(self.signals.curves_computed.emit, threads=context.worker_threads)
 
         self.update_cursor()
 
     def set_current_curve(self):
+        previous = self.curve
         if self.context.current_curve is not None:
             self.curve = self.curves[self.context.current_curve]
             self.context.hull_selection = self.curve.hull_selection
             self.signals.hull_selection.emit(self.context.hull_selection)
-            self.signals.change_weights.emit(self.curve.weights)
         else:
             self.curve = None
-        self.update()
+        self.invalidate_background()
+        for curve in (previous, self.curve):
+            if curve is not None:
+                self.update(self.curve_rects.get(curve, self.rect()))
+
+    def new_curve(self, **kwargs):
+        return Curve(curve_color=self.context.curve_color, points_color=self.context.points_color,
+                     hull_color=self.context.hull_color, size=self.context.pencil_size,
+                     hull_selection=self.context.hull_selection, tolerance=self.context.flatness_tolerance,
+                     spacing=self.context.sample_spacing, store=self.store, deferred=True, **kwargs)
+
+    def append_curves(self, curves):
+        """Adds curves at the end, announced with a single curves_added."""
+        first = len(self.curves)
+        for curve in curves:
+            self.rows[curve] = len(self.curves)
+            self.curves.append(curve)
+            self.points_index.add_curve(curve)
+            self.end_points.add_curve(curve)
+            curve.subscribe(self.curve_changed)
+        self.invalidate_background()  # painting submits the visible curves for evaluation
+        if len(curves) == 1:
+            self.curve_rects[curves[0]] = rect = self.curve_rect(curves[0])
+            self.update(rect)
+        elif curves:
+            self.update()  # rects of the curves are recorded as they change
+        if curves:
+            self.signals.curves_added.emit(first, len(curves))
 
     def add_curve(self):
-        c = Curve(curve_color=self.context.curve_color, points_color=self.context.points_color,
-                  hull_color=self.context.hull_color, size=self.context.pencil_size,
-                  hull_selection=self.context.hull_selection)
-        self.curves.append(c)
+        self.append_curves([self.new_curve()])
 
     def delete_curves(self, curves_to_remove):
+        curves_to_remove = set(curves_to_remove)
         for idx in curves_to_remove:
-            self.curves.pop(idx)
+            curve = self.curves[idx]
+            self.points_index.remove_curve(curve)
+            self.end_points.remove_curve(curve)
+            curve.unsubscribe(self.curve_changed)
+            self.worker.forget(curve)
+            curve.release()
+            self.update(self.curve_rects.pop(curve, self.rect()))
+        # in place, the curve list model views this list
+        self.curves[:] = [curve for idx, curve in enumerate(self.curves) if idx not in curves_to_remove]
+        self.rows = {curve: row for row, curve in enumerate(self.curves)}
+        self.invalidate_background()
 
-    def change_weight(self, row, val):
-        self.curve.change(row, w=val)
-        self.update()
+    @staticmethod
+    def curve_rect(curve):
+        """Region covered by the polyline, hull, point markers and labels of curve."""
+        box = curve.bounding_box()
+        if not box:
+            return QRect()
+        rect = QRectF(box[0], box[1], box[2] - box[0], box[3] - box[1])
+        if curve.pending_transform is not None:
+            rect = to_qtransform(curve.pending_transform).mapRect(rect)
+        margin = max(curve.size, 3) + 16
+        return rect.adjusted(-margin, -margin, margin, margin).toAlignedRect()
+
+    @staticmethod
+    def point_rect(p):
+        """Region covered by a highlighted control point marker."""
+        return QRectF(p[0] - 6, p[1] - 6, 12, 12).toAlignedRect()
 
     @staticmethod
     def poly(pts):
-        return QPolygonF(map(lambda p: QPointF(*p), pts))
+        """QPolygonF filled straight from an (N, 2) array through its point buffer
+        (QPointF is two contiguous qreals, which are doubles on desktop builds)."""
+        pts = np.ascontiguousarray(pts, dtype=np.float64).reshape((-1, 2))
+        polygon = QPolygonF(len(pts))
+        if len(pts):
+            buf = polygon.data()
+            buf.setsize(pts.nbytes)
+            np.frombuffer(buf, dtype=np.float64)[:] = pts.ravel()
+        return polygon
 
-    def paintEvent(self, event):
-        def actions(curve, pen_size=1):
-            # draw bezier curve
-            painter.setPen(QPen(curve.curve_color, curve.size, Qt.DashDotDotLine))
-            painter.drawPolyline(self.poly(curve.curve_points))
+    def draw_curve(self, painter, curve, pen_size=1):
+        # polylines are mapped by the painter, the pending transform is only baked when a gesture ends
+        painter.save()
+        if curve.pending_transform is not None:
+            painter.setTransform(to_qtransform(curve.pending_transform), True)
 
-            # draw hull
-            if curve.hull_selection:
-                painter.setPen(QPen(curve.hull_color, 3, Qt.SolidLine))
-                painter.drawPolyline(self.poly(curve.convex_hull()))
+        # draw bezier curve
+        painter.setPen(QPen(curve.curve_color, curve.size, Qt.DashDotDotLine))
+        painter.drawPolyline(self.poly(curve.curve_points))
 
-            # draw points
-            painter.setBrush(QBrush(curve.points_color))
-            painter.setPen(QPen(QColor(Qt.lightGray), pen_size))
-            for idx, (x, y) in enumerate(curve.control_points):
-                painter.drawEllipse(QRectF(x - 4, y - 4, 8, 8))
-                painter.drawText(QPointF(x-6, y-6), str(idx))
+        # draw hull
+        if curve.hull_selection:
+            painter.setPen(QPen(curve.hull_color, 3, Qt.SolidLine))
+            painter.drawPolyline(self.poly(curve.convex_hull()))
+        painter.restore()
+
+        # draw points, mapped here so the labels stay upright
+        painter.setBrush(QBrush(curve.points_color))
+        painter.setPen(QPen(QColor(Qt.lightGray), pen_size))
+        for idx, (x, y) in enumerate(curve.transformed(curve.control_points)):
+            painter.drawEllipse(QRectF(x - 4, y - 4, 8, 8))
+            painter.drawText(QPointF(x-6, y-6), str(idx))
+
+    def render_background(self):
+        """Pixmap with every curve except the current one, reused until one of them changes."""
+        pixmap = QPixmap(self.size())
+        pixmap.fill(Qt.transparent)
+        painter = QPainter(pixmap)
+        painter.setRenderHints(QPainter.Antialiasing)
+        visible = self.rect()
+        curves = [curve for curve in self.curves
+                  if curve is not self.curve and visible.intersects(self.curve_rect(curve))]
+        self.evaluate_later(curves)
+        for curve in curves:
+            self.draw_curve(painter, curve, pen_size=1)
+        painter.end()
+        return pixmap
+
+    def invalidate_background(self):
+        self.background = None
+
+    def damage_curve(self, curve):
+        """Repaints the union of the area curve covered before and covers now,
+        everything when the area before is not known."""
+        rect = self.curve_rect(curve)
+        if curve in self.curve_rects:
+            self.update(self.curve_rects[curve].united(rect))
+        else:
+            self.update()
+        self.curve_rects[curve] = rect
+
+    def set_high_light_points(self, points):
+        for curve, point_idx, _ in self.high_light_points + points:
+            self.update(self.point_rect(curve.control_points[point_idx]))
+        self.high_light_points = points
+
+    def curve_changed(self, curve, event, i=None):
+        if curve is not self.curve:
+            self.invalidate_background()
+        self.damage_curve(curve)
+        self.evaluate_later([curve])
+
+    def evaluate_later(self, curves):
+        """Has the worker evaluate those of curves with stale or missing samples.
+        The first batch large enough to shard starts the evaluation pool."""
+        curves = [curve for curve in curves if curve.stale or not curve.computed]
+        if len(curves) >= PARALLEL_MIN_CURVES and self.pool is None and self.context.worker_processes > 1:
+            # from the GUI thread and, when this is the first job, before the worker threads start
+            self.pool = self.worker.pool = EvaluationPool(self.context.worker_processes)
+        self.worker.submit(curves)
+
+    def apply_samples(self, results):
+        for curve, version, t, curve_points in results:
+            if self.worker.is_current(curve, version):
+                curve.set_curve_points(t, curve_points)
+                if curve is not self.curve:
+                    self.invalidate_background()
+                self.damage_curve(curve)
+            self.worker.done(curve, version)
+
+    def paintEvent(self, event):
+        if self.background is None or self.background.size() != self.size():
+            self.background = self.render_background()
+
+        exposed = event.region()
         painter = QPainter(self)
+        for rect in exposed.rects():
+            painter.drawPixmap(rect, self.background, rect)
         painter.setRenderHints(QPainter.Antialiasing)
 
-        for i, curve in enumerate(self.curves):
-            if curve and i != self.context.current_curve:
-                actions(curve, pen_size=1)
-            elif curve and i == self.context.current_curve:
-                actions(self.curve, pen_size=3)
+        if self.curve is not None and exposed.intersects(self.curve_rect(self.curve)):
+            self.evaluate_later([self.curve])
+            self.draw_curve(painter, self.curve, pen_size=3)
 
-        for curve_idx, point_idx, _ in self.high_light_points:
-            painter.setBrush(QBrush(self.curves[curve_idx].points_color))
+        for curve, point_idx, _ in self.high_light_points:
+            painter.setBrush(QBrush(curve.points_color))
             painter.setPen(QPen(QColor(Qt.lightGray), 3))
-            x, y = self.curves[curve_idx].control_points[point_idx]
+            x, y = curve.control_points[point_idx]
             painter.drawEllipse(QRectF(x - 4, y - 4, 8, 8))
 
+    def hit_point(self, pos):
+        """Activates the curve owning the control point under pos and returns
+        the point index, None if there is no point within reach."""
+        key, _ = self.points_index.nearest(pos, radius=np.sqrt(200))
+        if key is None:
+            return None
+        curve, i = key
+        if curve is not self.curve:
+            self.context.select_curve(self.rows[curve])
+        return i
+
     def mousePressEvent(self, event):
+        pos = [event.x(), event.y()]
+        if self.context.current_tool == Tools.Selection:
+            i = self.hit_point(pos)
+            if i is not None:
+                self.track(lambda p: self.curve.change(i, p=p))
+            return
+        elif self.context.current_tool == Tools.Eraser:
+            i = self.hit_point(pos)
+            if i is not None:
+                self.curve.pop(i)
+            return
         if not self.curve:
             return
-        pos = [event.x(), event.y()]
 
         def move(p):
             dx, dy = pos[0] - p[0], pos[1] - p[1]
@@ -108,94 +278,100 @@ class Canvas(QWidget):
             pos[:] = p[:]
 
         if self.context.current_tool == Tools.Grab:
-            self.tracking = move
+            self.track(move, preview=False)
         elif self.context.current_tool == Tools.Pencil:
             self.curve.append((event.x(), event.y()))
-            self.signals.new_point.emit()
-            self.update()
-        elif self.context.current_tool == Tools.Selection:
-            if not self.curve.control_points:
-                return
-            pp = np.array(self.curve.control_points)
-            pp = ((pp[:, 0] - event.x())**2 + (pp[:, 1] - event.y())**2)
-            if pp.min() < 200:
-                self.tracking = lambda p: self.curve.change(pp.argmin(), p=p)
-        elif self.context.current_tool == Tools.Eraser:
-            pp = np.array(self.curve.control_points)
-            pp = ((pp[:, 0] - event.x()) ** 2 + (pp[:, 1] - event.y()) ** 2)
-            if pp.min() < 200:
-                self.curve.pop(pp.argmin())
-                self.signals.delete_point.emit(pp.argmin())
-                self.update()
         elif self.context.current_tool == Tools.Slice:
-            pp = self.curve.curve_points
-            pp = ((pp[:, 0] - event.x()) ** 2 + (pp[:, 1] - event.y()) ** 2)
-            if pp.min() < 100:
-                new_curve = self.curve.split(pp.argmin())
-                self.curves.append(new_curve)
-                self.signals.add_curve_to_widget.emit()
-                self.signals.change_weights.emit(self.curve.weights)
-                self.update()
+            if len(self.curve.control_points) < 2:
+                return
+            t, dist = self.curve.project(pos)
+            if dist ** 2 < 100 and 0 < t < 1:  # cutting at an end point would leave an empty piece
+                new_curve = self.curve.split(t)
+                self.append_curves([new_curve])
         elif self.context.current_tool == Tools.Copy:
             new_curve = self.curve.copy()
             new_curve.translate(10, 10)  # for visual effect
-            self.curves.append(new_curve)
-            self.signals.add_curve_to_widget.emit()
-            self.update()
-        elif self.context.current_tool == Tools.Join:  # not working
+            new_curve.apply_transform()
+            self.append_curves([new_curve])
+        elif self.context.current_tool == Tools.Join:
             def high_light(p):
                 move(p)
-                curve_end_points = [self.curve.control_points[0], self.curve.control_points[-1]]
-                pp = ((end_points[:, None, :] - curve_end_points).reshape((-1, 2)) ** 2).sum(axis=1)
-                idx = pp.argmin()
-                if pp[idx] < 400 and (idx//4) != self.context.current_curve:
-                    curve_end = (idx % 2) * -1
-                    matching_curve_end = ((idx % 4) // 2) * -1
-                    idx = idx // 4
-                    self.high_light_points = [(idx, matching_curve_end, curve_end)]
-                    self.update()
+                found = self.end_points.nearest_foreign(self.curve, radius=20)
+                if found is not None:
+                    (curve, matching_curve_end), curve_end = found
+                    self.set_high_light_points([(curve, matching_curve_end, curve_end)])
                 else:
-                    self.high_light_points = []
-                    self.update()
-            end_points = np.array(list(chain.from_iterable((c.control_points[0], c.control_points[-1]) for c in self.curves)))
-            self.tracking = high_light
+                    self.set_high_light_points([])
+            if len(self.curve.control_points):
+                self.track(high_light, preview=False)
         elif self.context.current_tool == Tools.Rotate:
+            if not len(self.curve.control_points):
+                return
+            self.curve.calculate_center()  # loaded curves may not be evaluated yet
+
             def rot(p):
                 curr_pos_x, curr_pos_y = p - self.curve.center
-                alpha = np.arctan2(curr_pos_y, curr_pos_x) - alpha0
-                self.curve.rotate(alpha)
+                alpha = np.arctan2(curr_pos_y, curr_pos_x)
+                self.curve.rotate(alpha - alpha0[0])
+                alpha0[0] = alpha
 
-            pos0_x, pos0_y = pos - self.curve.center[1]
-            alpha0 = np.arctan2(pos0_y, pos0_x)
-            self.tracking = rot
+            pos0_x, pos0_y = pos - self.curve.center
+            alpha0 = [np.arctan2(pos0_y, pos0_x)]
+            self.track(rot, preview=False)
         elif self.context.current_tool == Tools.Elevate:
             self.curve.degree_elevation()
-            self.signals.change_weights.emit(self.curve.weights)
-            self.update()
         elif self.context.current_tool == Tools.Reduce:
             self.curve.degree_reduction()
-            self.signals.change_weights.emit(self.curve.weights)
-            self.update()
+
+    def track(self, tracking, preview=True):
+        """Routes mouse moves to tracking until release. Edits of the points are
+        previewed meanwhile, rigid moves only change the pending transform and
+        keep the samples."""
+        if preview:
+            self.curve.preview(self.context.preview_samples)
+        self.tracking = tracking
+        self.previewing = preview
+
+    def flush_motion(self):
+        """Passes the pending mouse position to tracking, then holds the next ones
+        back for a frame so fast mice cause at most one recompute per frame."""
+        if self.tracking and self.motion is not None:
+            motion, self.motion = self.motion, None
+            self.tracking(motion)
+            self.motion_timer.start(self.context.frame_budget)
 
     def mouseMoveEvent(self, event):
         if self.tracking:
-            self.tracking((event.x(), event.y()))
-            self.update()
+            self.motion = (event.x(), event.y())
+            if not self.motion_timer.isActive():
+                self.flush_motion()
 
     def mouseReleaseEvent(self, event):
-        self.tracking = None
+        self.flush_motion()
+        self.motion_timer.stop()
+        tracking, self.tracking = self.tracking, None
+        if tracking:
+            self.curve.apply_transform()
         if self.context.current_tool == Tools.Join and self.high_light_points:
-            curve_idx, curve_end, head = self.high_light_points[-1]
-            self.high_light_points = []
-            v1 = self.curves[curve_idx].control_points[curve_end]
-            v2 = self.curves[curve_idx].control_points[curve_end + 1 if curve_end == 0 else curve_end - 1]
+            curve, curve_end, head = self.high_light_points[-1]
+            self.set_high_light_points([])
+            v1 = curve.control_points[curve_end]
+            v2 = curve.control_points[curve_end + 1 if curve_end == 0 else curve_end - 1]
             self.curve.join(head, v1, self.context.c1_join, v2)
-            self.update()
-        elif self.context.current_tool == Tools.Rotate:
-            self.curve.update_tmp_points()
+        if tracking and self.previewing:
+            self.curve.compute()  # back from the preview samples used while dragging
+            self.evaluate_later([self.curve])
+        self.previewing = False
 
-    def update(self):
-        super(Canvas, self).update()
+    def shutdown(self):
+        """Ends the evaluation processes, once the application quits."""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = self.worker.pool = None
+
+    def update(self, *args):
+        """Schedules a repaint of the whole canvas, or only of the given rect or region."""
+        super(Canvas, self).update(*args)
 
     def update_cursor(self):
         path = Tools.get_cursor_path(self.context.current_tool)
@@ -214,7 +390,7 @@ class Canvas(QWidget):
             elif self.context.selected_color == 'hull':
                 self.curve.update_color(self.context.selected_color, self.context.hull_color)
             self.curve.hull_selection = self.context.hull_selection
-            self.update()
+            self.damage_curve(self.curve)
 
     def get_image(self):
         img = QPixmap(self.size())
@@ -224,25 +400,48 @@ class Canvas(QWidget):
         return img
 
     def get_csv(self):
-        list_of_curves = []
-        for i, curve in enumerate(self.curves):
-            n = len(curve.control_points)
-            idx = np.ones((n, 1)) * i
-            points = np.asarray(curve.control_points)
-            weights = np.asarray(curve.weights).reshape((n, 1))
-            list_of_curves.append(np.hstack([idx, points, weights]))
-        return np.vstack(list_of_curves)
-
-    def from_csv(self, arr):
-        if arr.shape[-1] == 3:
-            arr = np.hstack([arr, np.ones((arr.shape[0], 1))])
-        idxes = np.unique(arr[:, 0])
-        result = [arr[arr[:, 0] == i, 1:] for i in idxes]
-        for points in result:
-            new_curve = Curve(control_points=points[:, :2].tolist(), weights=points[:, 2].tolist(),
-                              curve_color=self.context.curve_color, points_color=self.context.points_color,
-                              hull_color=self.context.hull_color, size=self.context.pencil_size,
-                              hull_selection=self.context.hull_selection)
-            self.curves.append(new_curve)
-            self.signals.add_curve_to_widget.emit()
+        idx, points, weights = self.store.export([curve.slot for curve in self.curves])
+        return np.column_stack([idx, points, weights])
+
+    def save_document(self, file_name):
+        document.save(file_name, self.curves, rgba=lambda color: color.rgba())
+
+    def open_document(self, file_name):
+        store, new_curves = document.load(file_name, color=QColor.fromRgba, tolerance=self.context.flatness_tolerance,
+                                          spacing=self.context.sample_spacing, deferred=True)
+        if self.curves:
+            new_curves = [new_curve.copy(store=self.store) for new_curve in new_curves]
+        else:
+            self.store = store  # evaluated and read from disk as they are painted
+        self.append_curves(new_curves)
+        self.update()
+
+    def import_csv(self, file_name):
+        """Adds the curves of file_name chunk by chunk, while it is still being read."""
+        curves = {}  # curve number in the file -> curve
+        for runs, progress in read_csv_chunks(file_name):
+            new_curves = []
+            for i, points, weights in runs:
+                if i in curves:
+                    curves[i].extend(points, weights)
+                else:
+                    curves[i] = self.new_curve(control_points=points, weights=weights, compute=False)
+                    new_curves.append(curves[i])
+            self.append_curves(new_curves)
+            self.signals.load_progress.emit(progress)
         self.update()
+
+    def recompute_all(self):
+        for curve in self.curves:
+            curve.compute()  # only marks them stale, samples are replaced as the worker delivers them
+        self.evaluate_later(self.curves)
+
+    def update_tolerance(self, tolerance):
+        for curve in self.curves:
+            curve.tolerance = tolerance
+        self.recompute_all()
+
+    def update_spacing(self, spacing):
+        for curve in self.curves:
+            curve.spacing = spacing or None
+        self.recompute_all()
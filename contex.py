@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 # coding: utf-8
 
+from multiprocessing import cpu_count
 from PyQt4 import QtGui, QtCore
 
 
@@ -36,15 +37,24 @@ class Context:
 
         self.c1_join = False
 
+        self.flatness_tolerance = .5  # max distance in pixels between curve and its polyline
+        self.sample_spacing = None  # pixels between curve samples along the curve, replaces flatness_tolerance if set
+        self.frame_budget = 16  # ms, mouse moves of a drag are applied at most once per frame_budget
+        self.preview_samples = 64  # curve samples while dragging, full evaluation on release
+        self.worker_threads = 2  # threads evaluating curves in the background
+        self.worker_processes = cpu_count()  # processes sharing the evaluation of large documents
+
     def set_hull_selection(self, x):
         self.hull_selection = x
         self.signals.hull_selection.emit(x)
 
     def set_current_curve(self, x):
-        if x is not None:
-            self.current_curve = x.index
-        else:
-            self.current_curve = None
+        self.current_curve = x
+        self.signals.change_curve.emit()
+
+    def select_curve(self, index):
+        self.current_curve = index
+        self.signals.select_curve.emit(index)
         self.signals.change_curve.emit()
 
     def set_pencil_size(self, size):
@@ -52,6 +62,17 @@ class Context:
             self.pencil_size = size
             self.signals.update_pencil_size.emit(self.pencil_size)
 
+    def set_flatness_tolerance(self, x):
+        if x > 0:
+            self.flatness_tolerance = x
+            self.signals.update_tolerance.emit(x)
+
+    def set_sample_spacing(self, x):
+        """Samples curves every x pixels along them, adaptively if x is 0."""
+        if x >= 0:
+            self.sample_spacing = x or None
+            self.signals.update_spacing.emit(x)
+
     def set_join_type(self, x):
         self.c1_join = x
 
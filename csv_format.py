@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Curve csv files, rows of curve, x, y[, weight]. Shared by the editor and batch mode."""
+import os
+from itertools import islice
+
+import numpy as np
+
+
+def with_weights(arr):
+    """Rows of (curve, x, y, w), unit weights are added to rows of (curve, x, y)."""
+    arr = np.asarray(arr, dtype=float)
+    if arr.ndim != 2 or arr.shape[-1] not in (3, 4):
+        raise ValueError('expected rows of curve, x, y[, weight], got shape {}'.format(arr.shape))
+    if arr.shape[-1] == 3:
+        arr = np.hstack([arr, np.ones((arr.shape[0], 1))])
+    return arr
+
+
+def runs(arr):
+    """Splits rows of (curve, x, y, w) into runs of consecutive rows of one curve."""
+    starts = np.flatnonzero(np.diff(arr[:, 0])) + 1
+    return np.split(arr, starts) if len(arr) else []
+
+
+def group_curves(arr):
+    """Control points and weights of every curve in rows of (curve, x, y[, w]),
+    ordered by curve. Rows are only sorted when the curves are not in order already."""
+    arr = with_weights(arr)
+    if (np.diff(arr[:, 0]) < 0).any():
+        arr = arr[np.argsort(arr[:, 0], kind='mergesort')]
+    return [(run[:, 1:3], run[:, 3]) for run in runs(arr)]
+
+
+def read_csv(file_name):
+    return group_curves(np.loadtxt(file_name, delimiter=',', ndmin=2))
+
+
+def read_csv_chunks(file_name, chunk_rows=1 << 16):
+    """Reads file_name chunk_rows lines at a time and yields (curves, progress) after
+    every chunk: the (curve, points, weights) of the runs completed by it and the
+    fraction of the file read. A curve whose rows are not consecutive is yielded
+    once per run."""
+    size, done = float(os.path.getsize(file_name)) or 1., 0
+    tail = np.zeros((0, 4))  # run that may go on in the next chunk
+    with open(file_name) as f:
+        while True:
+            lines = list(islice(f, chunk_rows))
+            done += sum(len(line) for line in lines)
+            if lines and any(line.strip() for line in lines):
+                chunk = np.vstack((tail, with_weights(np.loadtxt(lines, delimiter=',', ndmin=2))))
+                chunk_runs = runs(chunk)
+                tail = chunk_runs.pop()
+            else:
+                chunk_runs = []
+            if not lines:
+                chunk_runs.append(tail)
+            yield [(int(run[0, 0]), run[:, 1:3], run[:, 3]) for run in chunk_runs if len(run)], done / size
+            if not lines:
+                return
@@ -1,124 +1,355 @@
 import numpy as np
-from scipy.spatial import ConvexHull
-from algorithms import casteljau, split_bezier, degree_elevation, degree_reduction
-from PyQt4.QtGui import QColor
-from PyQt4.QtCore import Qt
+from algorithms import casteljau, casteljau_batch, flatten, flatten_batch, subdivide, project, degree_elevation, \
+    degree_reduction, evaluate, bernstein, bernstein_column, convex_hull, arc_length_table, \
+    arc_length_samples, t_at_length
+from store import CurveStore
+
+PARALLEL_MIN_CURVES = 4096  # below this evaluate_curves stays in process, a pool costs more than it saves
 
 
 class Curve(object):
-    def __init__(self, control_points=None, weights=None, curve_color=QColor(Qt.red), points_color=QColor(Qt.red),
-                 hull_color=QColor(Qt.red), size=3, hull_selection=True):
-        self.control_points = control_points or []
-        self.weights = (weights or [1.] * len(control_points)) if control_points else []
-        self.curve_points = self.compute() if control_points else []
+    """View of one slot of a CurveStore plus everything derived from it.
+    Colors are opaque to the curve, the editor passes QColors."""
+    __slots__ = ('store', 'slot', 'curve_color', 'points_color', 'hull_color', 'hull_selection', 'size', 'tolerance',
+                 'curve_t', 'curve_points', 'curve_hom', 'center', 'hull_points', 'bounds', 'pending_transform',
+                 'observers', 'version', 'deferred', 'stale', 'spacing', 'arc_lengths')
+
+    def __init__(self, control_points=None, weights=None, curve_color=None, points_color=None,
+                 hull_color=None, size=3, hull_selection=True, tolerance=None,
+                 compute=True, store=None, slot=None, deferred=False, spacing=None):
+        self.store = store if store is not None else CurveStore(capacity=16)
+        if slot is None:
+            self.slot = self.store.allocate(control_points if control_points is not None else (), weights)
+        else:
+            self.slot = slot  # already filled, e.g. by document.load
         self.curve_color = curve_color
         self.points_color = points_color
         self.hull_color = hull_color
         self.hull_selection = hull_selection
         self.size = size
+        self.tolerance = tolerance  # max deviation of curve_points in pixels, fixed sampling if None
+        self.spacing = spacing  # max distance along the curve between curve_points in pixels, overrides tolerance
+        self.arc_lengths = None  # (control points, weights, t, s) cached arc_length_table()
+        self.curve_t = []  # parameter values of curve_points
+        self.curve_hom = None  # curve_points in homogeneous coordinates, kept for rational curves
         self.center = []
-        self.tmp_control_points = []  # used when rotating or moving object
-        self.tmp_curve_points = []  # used when rotating or moving object
+        self.hull_points = None  # cached convex_hull()
+        self.bounds = None  # cached bounding_box()
+        self.pending_transform = None  # 3x3 affine matrix not yet applied to the points, see transform
+        self.observers = []  # callables notified as observer(curve, event, index) after mutations
+        self.version = 0  # number of mutations, see notify
+        self.deferred = deferred  # compute() only marks curve_points stale, the owner evaluates them later
+        self.stale = False  # curve_points lag behind the control points, see compute
+        self.curve_points = []
+        if len(self.control_points) and compute:
+            self.compute()
+
+    @property
+    def control_points(self):
+        return self.store.get_points(self.slot)
+
+    @control_points.setter
+    def control_points(self, points):
+        self.store.assign(self.slot, points, self.weights if len(points) == len(self.weights) else None)
+
+    @property
+    def computed(self):
+        """False for curves created with compute=False and not evaluated since."""
+        return len(self.curve_points) > 0 or not len(self.control_points)
+
+    @property
+    def weights(self):
+        return self.store.get_weights(self.slot)
+
+    @weights.setter
+    def weights(self, weights):
+        self.weights[:] = weights
+
+    def set_control_points(self, points, weights=None):
+        self.store.assign(self.slot, points, weights)
+
+    def release(self):
+        """Gives the rows of the curve back to its store."""
+        self.store.release(self.slot)
+
+    def subscribe(self, observer):
+        self.observers.append(observer)
+
+    def unsubscribe(self, observer):
+        self.observers.remove(observer)
+
+    def notify(self, event, i=None):
+        """event is one of 'insert', 'pop', 'change' (of point i), 'reset' or 'transform'
+        (only pending_transform changed). Every mutation ends here, so caches
+        derived from all points are dropped too."""
+        if event != 'transform':
+            self.bounds = None
+            self.version += 1
+        for observer in self.observers:
+            observer(self, event, i)
 
     def append(self, p):
-        self.control_points.append(p)
-        self.weights.append(1.)
+        self.store.insert(self.slot, len(self.control_points), p)
+        self.extend_hull(p)
         self.compute()
+        self.notify('insert', len(self.control_points) - 1)
 
     def insert(self, i, p):
-        self.control_points.insert(i, p)
-        self.weights.insert(i, 1.)
+        self.store.insert(self.slot, i, p)
+        self.extend_hull(p)
+        self.compute()
+        self.notify('insert', i)
+
+    def extend(self, points, weights=None):
+        """Appends all points at once."""
+        weights = np.ones(len(points)) if weights is None else weights
+        self.set_control_points(np.vstack((self.control_points, points)), np.concatenate((self.weights, weights)))
+        self.hull_points = None
         self.compute()
+        self.notify('reset')
 
     def pop(self, i):
-        point = self.control_points.pop(i)
-        self.weights.pop(i)
+        point, _ = self.store.pop(self.slot, i)
+        self.hull_points = None
         self.compute()
+        self.notify('pop', i)
         return point
 
     def change(self, i, p=None, w=None):
-        if p:
+        incremental = len(self.control_points) > 1 and len(self.curve_points) == len(self.curve_t) > 1 \
+            and not self.stale and self.tolerance is None and self.spacing is None  # adaptive t must move too
+        if incremental:
+            old_p, old_w = self.control_points[i].copy(), self.weights[i]
+        if p is not None:
             self.control_points[i] = p
+            self.hull_points = None
         if w:
             self.weights[i] = w
-        self.compute()
+        if incremental:
+            self.update_curve_points(i, old_p, old_w)
+        else:
+            self.compute()
+        self.notify('change', i)
+
+    def change_weights(self, weights):
+        """Sets the weights given as {index: weight} with a single update of
+        curve_points, then notifies a change of each of them."""
+        idx = sorted(i for i, w in weights.iteritems() if w)
+        if not idx:
+            return
+        old_w = self.weights[idx].copy()
+        self.weights[idx] = [weights[i] for i in idx]
+        if len(self.control_points) > 1 and len(self.curve_points) == len(self.curve_t) > 1 and not self.stale \
+                and self.tolerance is None and self.spacing is None:
+            if self.curve_hom is None:
+                self.curve_hom = evaluate(self.curve_t, self.control_points, self.weights)
+            else:
+                dw = self.weights[idx] - old_w
+                b = bernstein(len(self.control_points) - 1, self.curve_t)[:, idx]
+                self.curve_hom += b.dot(np.column_stack((self.control_points[idx] * dw[:, None], dw)))
+            self.curve_points = self.curve_hom[:, :2] / self.curve_hom[:, 2, None]
+        else:
+            self.compute()
+        for i in idx:
+            self.notify('change', i)
+
+    def update_curve_points(self, i, old_p, old_w):
+        """Moves curve_points by the change of control point i (with weight),
+        which is that change scaled by the i-th Bernstein polynomial."""
+        b = bernstein_column(len(self.control_points) - 1, i, self.curve_t)[:, None]
+        p, w = self.control_points[i], self.weights[i]
+        if self.curve_hom is not None:
+            self.curve_hom += b * (np.append(p * w, w) - np.append(old_p * old_w, old_w))
+        elif w == old_w == 1 and (self.weights == 1).all():
+            self.curve_points = self.curve_points + b * (p - old_p)
+        else:
+            self.curve_hom = evaluate(self.curve_t, self.control_points, self.weights)
+        if self.curve_hom is not None:
+            self.curve_points = self.curve_hom[:, :2] / self.curve_hom[:, 2, None]
+        self.calculate_center()
 
-    def copy(self):
-        return Curve(control_points=self.control_points[:], weights=self.weights, curve_color=self.curve_color,
-                     points_color=self.points_color, hull_color=self.hull_color, size=self.size,
-                     hull_selection=self.hull_selection)
+    def copy(self, store=None):
+        """Same curve in store, by default in the store of this one. Cached bounds are kept."""
+        c = Curve(control_points=self.control_points, weights=self.weights, curve_color=self.curve_color,
+                  points_color=self.points_color, hull_color=self.hull_color, size=self.size,
+                  hull_selection=self.hull_selection, tolerance=self.tolerance,
+                  store=store if store is not None else self.store, deferred=self.deferred,
+                  spacing=self.spacing)
+        c.bounds = self.bounds
+        return c
 
-    def split(self, i, n=1000):
-        left, right, l_w, r_w = split_bezier(np.linspace(0, 1, n), np.asarray(self.control_points), by=i, w=self.weights)
-        self.control_points = left.tolist()
-        self.weights = l_w.tolist()
+    def split(self, t):
+        """Cuts the curve at parameter t, keeps the first piece and returns the
+        rest as a new curve, or as a list of curves when t is a sequence."""
+        pieces = subdivide(self.control_points, t, self.weights)
+        self.set_control_points(*pieces[0])
+        self.hull_points = None
         self.compute()
-        return Curve(control_points=right.tolist(), weights=r_w.tolist(), curve_color=self.curve_color,
-                     points_color=self.points_color, hull_color=self.hull_color, size=self.size,
-                     hull_selection=self.hull_selection)
+        self.notify('reset')
+        new_curves = [Curve(control_points=right, weights=r_w, curve_color=self.curve_color,
+                            points_color=self.points_color, hull_color=self.hull_color, size=self.size,
+                            hull_selection=self.hull_selection, tolerance=self.tolerance, store=self.store,
+                            deferred=self.deferred, spacing=self.spacing)
+                      for right, r_w in pieces[1:]]
+        return new_curves if np.ndim(t) else new_curves[0]
+
+    def project(self, q):
+        """Parameter and distance of the point of the curve closest to q."""
+        return project(q, self.control_points, self.weights)
+
+    def transform(self, m):
+        """Composes the 3x3 affine matrix m after the pending transform. Nothing
+        is moved until apply_transform, painting goes through pending_transform."""
+        self.pending_transform = m if self.pending_transform is None else m.dot(self.pending_transform)
+        self.notify('transform')
 
     def translate(self, dx, dy):
-        self.control_points = [(px-dx, py-dy) for px, py in self.control_points]
-        self.curve_points -= [dx, dy]
-        self.calculate_center()
-        self.update_tmp_points()
+        self.transform(np.array([[1., 0., -dx], [0., 1., -dy], [0., 0., 1.]]))
 
     def rotate(self, alpha):
-        tmp_control_points = np.array(self.tmp_control_points) - self.center
-        tmp_curve_points = self.tmp_curve_points - self.center
+        """Rotation by alpha around center."""
+        c, s = np.cos(alpha), np.sin(alpha)
+        x, y = self.center
+        self.transform(np.array([[c, -s, x - c * x + s * y], [s, c, y - s * x - c * y], [0., 0., 1.]]))
 
-        # 2D Rotation matrix
-        R = np.array([[np.cos(alpha), -np.sin(alpha)],
-                      [np.sin(alpha), np.cos(alpha)]])
+    def transformed(self, points):
+        """points mapped by the pending transform."""
+        points = np.asarray(points, dtype=float)
+        if self.pending_transform is None:
+            return points
+        m = self.pending_transform
+        return points.dot(m[:2, :2].T) + m[:2, 2]
 
-        self.control_points = (R[:, None, :].dot(tmp_control_points.T)[:, 0, :].T + self.center).tolist()
-        self.curve_points = R[:, None, :].dot(tmp_curve_points.T)[:, 0, :].T + self.center
+    def apply_transform(self):
+        """Bakes the pending transform into the points. Affine maps commute with
+        evaluation and keep hulls, so samples and hull are mapped, not recomputed."""
+        if self.pending_transform is None:
+            return
+        self.control_points[:] = self.transformed(self.control_points)
+        if len(self.curve_points):
+            self.curve_points = self.transformed(self.curve_points)
+        if self.hull_points is not None:
+            self.hull_points = self.transformed(self.hull_points)
+        self.pending_transform = None
+        self.curve_hom = None
+        self.calculate_center()
+        self.notify('reset')
 
     def join(self, head, val, c1=False, val2=None):
         assert head in [0, -1]
         dx, dy = self.control_points[head][0] - val[0], self.control_points[head][1] - val[1]
         if c1 and val2 is not None:
             next_val_idx = head + 1 if head == 0 else head - 1
-            self.control_points = [(px - dx, py - dy) for px, py in self.control_points]
+            self.control_points[:] -= [dx, dy]
             self.control_points[next_val_idx] = [2*self.control_points[head][0] - val2[0],
                                                  2*self.control_points[head][1] - val2[1]]
+            self.hull_points = None
             self.compute()
+            self.notify('reset')
         else:
             self.translate(dx, dy)
+            self.apply_transform()
 
     def degree_elevation(self):
         if len(self.control_points) > 2:
             new_points, new_weights = degree_elevation(self.control_points, w=self.weights)
-            self.control_points, self.weights = new_points.tolist(), new_weights.tolist()
+            self.set_control_points(new_points, new_weights)
+            self.hull_points = None
             self.compute()
+            self.notify('reset')
 
     def degree_reduction(self):
         if len(self.control_points) > 3:
             new_points, new_weights = degree_reduction(self.control_points, w=self.weights)
-            self.control_points, self.weights = new_points.tolist(), new_weights.tolist()
+            self.set_control_points(new_points, new_weights)
+            self.hull_points = None
             self.compute()
+            self.notify('reset')
 
     def compute(self, n=1000):
         points = np.array(self.control_points)
         if len(points) < 2:
+            self.curve_t = np.zeros(len(points))
             self.curve_points = np.array(points)
-        else:
-            self.curve_points = casteljau(np.linspace(0, 1, n), points.T, weights=self.weights)
             self.calculate_center()
-        self.update_tmp_points()
+        elif self.deferred:
+            self.stale = True
+            self.calculate_center()  # from the control points, it must not wait for the samples
+        else:
+            if self.spacing:
+                t, curve_points = arc_length_samples(points, self.weights, self.spacing,
+                                                     table=self.arc_length_table())
+            elif self.tolerance:
+                t, curve_points = flatten(points, self.weights, self.tolerance)
+            else:
+                t = np.linspace(0, 1, n)
+                curve_points = casteljau(t, points.T, weights=self.weights)
+            self.set_curve_points(t, curve_points)
         return self.curve_points
 
+    def preview(self, n=64):
+        """Cheap fixed sampling for interactive edits, compute() restores full quality."""
+        if len(self.control_points) > 1:
+            t = np.linspace(0, 1, n)
+            self.set_curve_points(t, casteljau(t, self.control_points.T, weights=self.weights))
+
+    def set_curve_points(self, t, curve_points):
+        self.curve_t = t
+        self.curve_points = curve_points
+        self.curve_hom = None
+        self.stale = False
+        self.calculate_center()
+
+    def arc_length_table(self):
+        """Parameters t and arc lengths s up to them, of the points without the
+        pending transform. Cached until the points or weights change, compared
+        by value as compute runs before the mutation is notified."""
+        points, weights = self.control_points, self.weights
+        cached = self.arc_lengths
+        if cached is None or not (np.array_equal(cached[0], points) and np.array_equal(cached[1], weights)):
+            cached = self.arc_lengths = (points.copy(), weights.copy()) + arc_length_table(points, weights)
+        return cached[2:]
+
+    def length(self):
+        return self.arc_length_table()[1][-1]
+
+    def t_at_length(self, length):
+        """Parameter at which the arc length reaches length, which may be a sequence."""
+        return t_at_length(length, self.arc_length_table(), self.control_points, self.weights)
+
+    def point_at_length(self, length):
+        """Point of the curve at arc length length from its start, or points for a sequence."""
+        t = self.t_at_length(length)
+        h = evaluate(np.atleast_1d(t), self.control_points, self.weights)
+        points = h[:, :2] / h[:, 2, None]
+        return points if np.ndim(t) else points[0]
+
     def calculate_center(self):
         cp = np.array(self.control_points)
+        if not len(cp):
+            self.center = []
+            return
         self.center = np.array([(cp[:, 0].max(axis=0) + cp[:, 0].min(axis=0)) / 2,
                                 (cp[:, 1].max(axis=0) + cp[:, 1].min(axis=0)) / 2])
 
     def convex_hull(self):
-        points = np.array(self.control_points)
-        if len(points) < 3:
-            return points
-        vertices = ConvexHull(points).vertices.tolist()
-        return points[vertices + vertices[:1], :]
+        if self.hull_points is None:
+            self.hull_points = convex_hull(self.control_points)
+        return self.hull_points
+
+    def bounding_box(self):
+        """Box (xmin, ymin, xmax, ymax) of the control points, which holds the curve too."""
+        if self.bounds is None:
+            points = self.control_points
+            self.bounds = tuple(points.min(axis=0)) + tuple(points.max(axis=0)) if len(points) else ()
+        return self.bounds
+
+    def extend_hull(self, p):
+        """Hull after adding point p is the hull of the old hull and p."""
+        if self.hull_points is not None and len(self.control_points) > 3:
+            self.hull_points = convex_hull(np.vstack((self.hull_points[:-1], [p])))
+        else:
+            self.hull_points = None
 
     def update_color(self, kind, color):
         if kind == 'curve':
@@ -128,6 +359,31 @@ class Curve(object):
         elif kind == 'hull':
             self.hull_color = color
 
-    def update_tmp_points(self):
-        self.tmp_control_points = [[x, y] for x, y in self.control_points]
-        self.tmp_curve_points = self.curve_points.copy()
+
+def evaluate_curves(control_points, weights, tolerance=None, n=1000, pool=None, spacing=None):
+    """(t, curve_points) of every curve, as Curve.compute would find them.
+    Many curves are sharded across the processes of pool, a parallel.EvaluationPool."""
+    if pool is not None and len(control_points) >= PARALLEL_MIN_CURVES:
+        return pool.evaluate(control_points, weights, tolerance, n, spacing)
+    if spacing:
+        return [arc_length_samples(p, w, spacing) for p, w in zip(control_points, weights)]
+    if tolerance:
+        return flatten_batch(control_points, weights, tolerance)
+    t = np.linspace(0, 1, n)
+    return [(t, curve_points) for curve_points in casteljau_batch(t, control_points, weights)]
+
+
+def compute_curves(curves, n=1000, pool=None):
+    """Recompute curve_points of all curves, batched by sampling mode."""
+    groups = {}
+    for c in curves:
+        if len(c.control_points) < 2:
+            c.compute()
+        else:
+            groups.setdefault((c.tolerance, c.spacing), []).append(c)
+
+    for (tolerance, spacing), group in groups.items():
+        samples = evaluate_curves([c.control_points for c in group], [c.weights for c in group], tolerance, n,
+                                  pool, spacing)
+        for c, (t, curve_points) in zip(group, samples):
+            c.set_curve_points(t, curve_points)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Binary documents: a header, a table with one row per curve, then the control
+points and the weights of all curves as two contiguous little endian float64
+arrays. Files are opened through np.memmap, so nothing is parsed and points
+are only read from disk once they are touched."""
+import os
+import numpy as np
+from curve import Curve
+from store import CurveStore
+
+MAGIC = 'BEZIERDC'
+VERSION = 1
+HEADER = np.dtype([('magic', 'S8'), ('version', '<u4'), ('curves', '<u4'), ('points', '<u8')])
+TABLE = np.dtype([('offset', '<u8'), ('length', '<u8'), ('colors', '<u4', 3), ('size', '<u2'),
+                  ('hull_selection', 'u1'), ('reserved', 'u1'), ('bounds', '<f8', 4)])
+
+
+def save(file_name, curves, rgba=None):
+    """Writes curves with their style, rgba maps a colour to a 32 bit ARGB integer,
+    by default colours are integers already and missing ones are written as 0."""
+    rgba = rgba or (lambda color: color or 0)
+    lengths = np.array([len(c.control_points) for c in curves], dtype=int)
+    table = np.zeros(len(curves), dtype=TABLE)
+    table['offset'] = np.cumsum(lengths) - lengths
+    table['length'] = lengths
+    table['colors'] = [[rgba(c.curve_color), rgba(c.points_color), rgba(c.hull_color)] for c in curves]
+    table['size'] = [c.size for c in curves]
+    table['hull_selection'] = [c.hull_selection for c in curves]
+    # only bounds that are cached already, computing them would read every curve here
+    table['bounds'] = [c.bounds if c.bounds and len(c.control_points) else (np.nan,) * 4 for c in curves]
+    header = np.array([(MAGIC, VERSION, len(curves), lengths.sum())], dtype=HEADER)
+
+    points = np.concatenate([c.control_points for c in curves] or [np.zeros((0, 2))])
+    weights = np.concatenate([c.weights for c in curves] or [np.zeros(0)])
+    # written aside and renamed, a document may still be mapped by load and truncating it would break the map
+    tmp_name = file_name + '.tmp'
+    with open(tmp_name, 'wb') as f:
+        for arr in (header, table, points.astype('<f8'), weights.astype('<f8')):
+            f.write(arr.tobytes())
+    if os.name == 'nt' and os.path.exists(file_name):
+        os.remove(file_name)
+    os.rename(tmp_name, file_name)
+
+
+def load(file_name, color=None, **kwargs):
+    """Store over the arrays of file_name, mapped copy-on-write, and the curves
+    in it. Curves are not evaluated and carry their bounds from the file, so
+    culling does not read their points. color maps the stored ARGB integers
+    back, kwargs go to every Curve."""
+    with open(file_name, 'rb') as f:
+        header = np.fromfile(f, dtype=HEADER, count=1)
+        if not len(header) or header['magic'][0] != MAGIC:
+            raise ValueError('{} is not a bezier document'.format(file_name))
+        if header['version'][0] > VERSION:
+            raise ValueError('{} has unsupported version {}'.format(file_name, header['version'][0]))
+        n, total = int(header['curves'][0]), int(header['points'][0])
+        table = np.fromfile(f, dtype=TABLE, count=n)
+    if len(table) != n:
+        raise ValueError('{} is truncated'.format(file_name))
+
+    start = HEADER.itemsize + n * TABLE.itemsize
+    if total:
+        points = np.memmap(file_name, dtype='<f8', mode='c', offset=start, shape=(total, 2))
+        weights = np.memmap(file_name, dtype='<f8', mode='c', offset=start + 16 * total, shape=(total,))
+    else:
+        points, weights = np.zeros((0, 2)), np.zeros(0)
+    store = CurveStore.from_arrays(points, weights, table['offset'], table['length'])
+
+    color = color or (lambda value: value)
+    curves = []
+    for slot, row in enumerate(table):
+        curve_color, points_color, hull_color = [color(int(value)) for value in row['colors']]
+        c = Curve(curve_color=curve_color, points_color=points_color, hull_color=hull_color, size=int(row['size']),
+                  hull_selection=bool(row['hull_selection']), compute=False, store=store, slot=slot, **kwargs)
+        if not np.isnan(row['bounds']).any():
+            c.bounds = tuple(row['bounds'])
+        curves.append(c)
+    return store, curves
@@ -8,6 +8,7 @@ from PyQt4.QtCore import Qt
 
 from canvas import Canvas
 from palette import Palette
+from startup import timings
 
 from tools import Tools, THEME, ToolProperties, CurveProperties, CurveSelector
 
@@ -26,14 +27,19 @@ class MainWindow(QtGui.QMainWindow):
 
         self.tools = QtGui.QActionGroup(self)
 
-        self.menuBar = self.create_menu_bar()
-        self.toolBar = self.create_tool_bar()
-        self.create_dock_widgets()
+        with timings.measure('widget', 'menu bar'):
+            self.menuBar = self.create_menu_bar()
+        with timings.measure('widget', 'tool bar'):
+            self.toolBar = self.create_tool_bar()
 
-        self.main_widget = Canvas(context, signals, self)
-        self.setCentralWidget(self.main_widget)
+        with timings.measure('widget', 'canvas'):
+            self.main_widget = Canvas(context, signals, self)
+            self.setCentralWidget(self.main_widget)
+        self.create_dock_widgets()
+        self.signals.load_progress.connect(self.show_progress)
 
-        self.show()
+        with timings.measure('widget', 'show'):
+            self.show()
 
     def create_tool_bar_actions(self):
         tool_bar_actions = []
@@ -95,25 +101,31 @@ class MainWindow(QtGui.QMainWindow):
 
     def create_dock_widgets(self):
         # Palette widget
-        palette = QtGui.QDockWidget('palette', self)
-        palette.setAllowedAreas(Qt.RightDockWidgetArea)
-        palette.setFeatures(QtGui.QDockWidget.NoDockWidgetFeatures)
-        palette.setWidget(Palette(self.context, self.signals))
+        with timings.measure('widget', 'palette'):
+            palette = QtGui.QDockWidget('palette', self)
+            palette.setAllowedAreas(Qt.RightDockWidgetArea)
+            palette.setFeatures(QtGui.QDockWidget.NoDockWidgetFeatures)
+            palette.setWidget(Palette(self.context, self.signals))
         palette.setSizePolicy(QtGui.QSizePolicy.Preferred, QtGui.QSizePolicy.Minimum)
         self.addDockWidget(Qt.RightDockWidgetArea, palette)
 
         # Global properties
-        curve_properties = CurveProperties('curve properties', self.context, self.signals)
+        with timings.measure('widget', 'curve properties'):
+            curve_properties = CurveProperties('curve properties', self.context, self.signals,
+                                               self.main_widget.curves)
         curve_properties.setSizePolicy(QtGui.QSizePolicy.Maximum, QtGui.QSizePolicy.Maximum)
         self.addDockWidget(Qt.RightDockWidgetArea, curve_properties)
 
         # Tool Properties widget
-        tool_properties = ToolProperties('tool properties', self.context, self.signals)
+        with timings.measure('widget', 'tool properties'):
+            tool_properties = ToolProperties('tool properties', self.context, self.signals)
         tool_properties.setSizePolicy(QtGui.QSizePolicy.Preferred, QtGui.QSizePolicy.Expanding)
         self.addDockWidget(Qt.RightDockWidgetArea, tool_properties)
 
         # Curves
-        curve_selector = CurveSelector('curve selector', self.context, self.signals, self)
+        with timings.measure('widget', 'curve selector'):
+            curve_selector = CurveSelector('curve selector', self.context, self.signals, self.main_widget.curves,
+                                           self)
         curve_selector.setSizePolicy(QtGui.QSizePolicy.Preferred, QtGui.QSizePolicy.Expanding)
         self.addDockWidget(Qt.RightDockWidgetArea, curve_selector)
 
@@ -127,16 +139,22 @@ class MainWindow(QtGui.QMainWindow):
     def open_file(self):
         title = 'Open from file'
         directory = os.getcwd()
-        _filter = 'CSV (*.csv);;All files (*)'
+        _filter = 'Bezier document (*.bez);;CSV (*.csv);;All files (*)'
         file_name = str(QtGui.QFileDialog.getOpenFileName(self, title, directory, _filter))
         try:
-            result = np.loadtxt(file_name, delimiter=',')
-            assert result.shape[-1] in [3, 4]
-            self.main_widget.from_csv(result)
+            if os.path.splitext(file_name)[1] == '.csv':
+                self.main_widget.import_csv(file_name)
+            else:
+                self.main_widget.open_document(file_name)
             text = 'Curves have been successfully loaded from\n{}'.format(file_name)
             QtGui.QMessageBox.information(self, 'Successful !', text)
         except Exception as ex:
             QtGui.QMessageBox.information(self, 'Error !', ex.message)
+        self.statusBar().clearMessage()
+
+    def show_progress(self, progress):
+        self.statusBar().showMessage('loading {:.0%}'.format(progress))
+        QtGui.QApplication.processEvents(QtCore.QEventLoop.ExcludeUserInputEvents)
 
     def save(self, title, _filter, getter, exts, saver):
         directory = os.getcwd()
@@ -154,11 +172,16 @@ class MainWindow(QtGui.QMainWindow):
             QtGui.QMessageBox.information(self, 'Error !', 'wrong extension: {}'.format(ext))
 
     def save_file(self):
-        title = 'Save to csv'
-        _filter = '*.csv;;'
-        ext = ['.csv']
-        saver = lambda arr, file_name: np.savetxt(file_name, arr, delimiter=',')
-        self.save(title=title, _filter=_filter, getter=self.main_widget.get_csv, exts=ext, saver=saver)
+        def saver(canvas, file_name):
+            if os.path.splitext(file_name)[1] == '.csv':
+                np.savetxt(file_name, canvas.get_csv(), delimiter=',')
+            else:
+                canvas.save_document(file_name)
+
+        title = 'Save document'
+        _filter = '*.bez;;*.csv;;'
+        ext = ['.bez', '.csv']
+        self.save(title=title, _filter=_filter, getter=lambda: self.main_widget, exts=ext, saver=saver)
 
     def save_file_as(self):
         title = 'Save as image'
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Evaluation of many curves on a pool of processes. The pool is started once,
+from the main thread when a first large batch needs it, and reused. Control
+points and weights of every call are written once to a shared memory file that
+the processes map, workers read their shard of curves from there and no curve
+is pickled. Fixed samplings are written back to a mapped file as well, adaptive
+and arc length ones have no size known in advance and come back as one packed
+array per shard."""
+import os
+import tempfile
+from multiprocessing import Pool
+
+import numpy as np
+from algorithms import casteljau_batch, flatten_batch, arc_length_samples
+
+SHARED_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None  # tmpfs where there is one
+
+
+def share(files, shape, arr=None):
+    """Adds the name of a new shared file of float64 of shape to files, the file
+    holds a copy of arr or zeros."""
+    fd, name = tempfile.mkstemp(prefix='bezier-', suffix='.f8', dir=SHARED_DIR)
+    os.close(fd)
+    files.append(name)
+    if int(np.prod(shape)):
+        view = np.memmap(name, dtype='<f8', mode='w+', shape=shape)
+        if arr is not None:
+            view[...] = arr
+        del view
+
+
+def mapped(name, shape, mode='r'):
+    if not int(np.prod(shape)):
+        return np.zeros(shape)
+    return np.memmap(name, dtype='<f8', mode=mode, shape=shape)
+
+
+def evaluate_shard(job):
+    """Evaluates the curves of a shard, given by the offsets and lengths of their
+    points in the shared arrays and the index start of the first one. Fixed
+    samplings are written to the shared output, other ones are returned as the
+    number of samples of every curve with all their t and points."""
+    files, shape, offsets, lengths, start, tolerance, n, spacing = job
+    points, weights = mapped(files[0], (shape[1], 2)), mapped(files[1], (shape[1],))
+    control_points = [points[o:o + l] for o, l in zip(offsets, lengths)]
+    weights = [weights[o:o + l] for o, l in zip(offsets, lengths)]
+    if not tolerance and not spacing:
+        out = mapped(files[2], (shape[0], n, 2), mode='r+')
+        t = np.linspace(0, 1, n)
+        for i, curve_points in enumerate(casteljau_batch(t, control_points, weights), start):
+            if lengths[i - start] > 1:
+                out[i] = curve_points
+        out.flush()
+        return None
+    if spacing:
+        samples = [arc_length_samples(p, w, spacing) for p, w in zip(control_points, weights)]
+    else:
+        samples = flatten_batch(control_points, weights, tolerance)
+    counts = np.array([len(t) for t, _ in samples], dtype=int)
+    return counts, np.concatenate([t for t, _ in samples]), np.vstack([p for _, p in samples])
+
+
+def shards(lengths, count):
+    """Bounds of about count shards of consecutive curves with similar numbers of points."""
+    cost = np.cumsum(lengths)
+    bounds = np.searchsorted(cost, np.linspace(0, cost[-1], count + 1)[1:-1], side='right')
+    bounds = np.unique(np.concatenate(([0], bounds, [len(lengths)])))
+    return zip(bounds[:-1], bounds[1:])
+
+
+class EvaluationPool(object):
+    """Processes evaluating shards of curves, see evaluate. Several threads may
+    call evaluate at once, they share the processes. close() ends them."""
+
+    def __init__(self, processes=2):
+        self.processes = processes
+        self.pool = Pool(processes)
+
+    def evaluate(self, control_points, weights, tolerance=None, n=1000, spacing=None):
+        """(t, curve_points) of every curve as curve.evaluate_curves finds them,
+        with the curves sharded across the processes."""
+        lengths = np.array([len(p) for p in control_points], dtype=int)
+        if not len(lengths) or not lengths.sum():
+            return [(np.zeros(len(p)), np.asarray(p, dtype=float)) for p in control_points]
+        offsets = np.cumsum(lengths) - lengths
+        fixed = not tolerance and not spacing
+        shape = len(lengths), int(lengths.sum())
+        files = []
+        try:
+            share(files, (shape[1], 2), np.vstack([np.reshape(p, (-1, 2)) for p in control_points]))
+            share(files, (shape[1],), np.concatenate(weights))
+            if fixed:
+                share(files, (shape[0], n, 2))
+            jobs = [(files, shape, offsets[start:stop], lengths[start:stop], start, tolerance, n, spacing)
+                    for start, stop in shards(lengths, 4 * self.processes)]
+            packed = self.pool.map(evaluate_shard, jobs)
+            if fixed:
+                t = np.linspace(0, 1, n)
+                curve_points = np.array(mapped(files[2], (len(lengths), n, 2)))
+                return [(t, curve_points[i]) if lengths[i] > 1 else (t, np.asarray(p, dtype=float))
+                        for i, p in enumerate(control_points)]
+        finally:
+            for name in files:
+                os.remove(name)
+        samples = []
+        for counts, t, points in packed:
+            ends = np.cumsum(counts)[:-1]
+            samples.extend(zip(np.split(t, ends), np.split(points, ends)))
+        return samples
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Evaluation of curves off the GUI thread."""
+import threading
+import traceback
+from Queue import Queue
+from curve import evaluate_curves
+
+
+class RecomputeWorker(object):
+    """Evaluates snapshots of curves on daemon threads, the kernels are NumPy
+    and release the GIL for most of their time. Each job is tagged with the
+    version of its curve, the version and sampling mode the job evaluates. A newer
+    job for a curve makes the older ones stale, stale jobs are skipped. Results
+    are passed from a worker thread to on_result as a list of
+    (curve, version, t, curve_points), the receiver keeps those that are still
+    current (see is_current) and calls done. Large jobs are sharded across
+    the processes of pool, see curve.evaluate_curves. The threads start with
+    the first job, a pool set before that is forked from a single thread."""
+
+    def __init__(self, on_result, threads=2, pool=None):
+        self.on_result = on_result
+        self.pool = pool
+        self.jobs = Queue()
+        self.latest = {}  # curve -> version of its newest job
+        self.lock = threading.Lock()
+        self.threads = [threading.Thread(target=self.run) for _ in xrange(threads)]
+        self.started = False
+
+    def start(self):
+        if not self.started:
+            self.started = True
+            for thread in self.threads:
+                thread.daemon = True
+                thread.start()
+
+    @staticmethod
+    def version(curve):
+        return curve.version, curve.tolerance, curve.spacing
+
+    def is_current(self, curve, version):
+        """Whether version is the newest job of curve and curve has not changed since."""
+        with self.lock:
+            return self.latest.get(curve) == version == self.version(curve)
+
+    def submit(self, curves):
+        """Queues the evaluation of curves as they are now, one job per sampling mode.
+        Curves with a job for their current version already are left out."""
+        groups = {}
+        with self.lock:
+            for c in curves:
+                version = self.version(c)
+                if self.latest.get(c) == version:
+                    continue
+                if len(c.control_points) < 2:
+                    c.compute()  # nothing to evaluate
+                    continue
+                self.latest[c] = version
+                groups.setdefault((c.tolerance, c.spacing), []).append(
+                    (c, version, c.control_points.copy(), c.weights.copy()))
+        if groups:
+            self.start()
+        for mode, group in groups.iteritems():
+            self.jobs.put((mode, group))
+
+    def done(self, curve, version):
+        with self.lock:
+            if self.latest.get(curve) == version:
+                del self.latest[curve]
+
+    def forget(self, curve):
+        """Drops the pending job of curve, its result will not be current."""
+        with self.lock:
+            self.latest.pop(curve, None)
+
+    def run(self):
+        while True:
+            (tolerance, spacing), group = self.jobs.get()
+            with self.lock:
+                group = [job for job in group if self.latest.get(job[0]) == job[1]]
+            if not group:
+                continue
+            try:
+                samples = evaluate_curves([job[2] for job in group], [job[3] for job in group], tolerance,
+                                          pool=self.pool, spacing=spacing)
+            except Exception:
+                traceback.print_exc()  # keep the thread alive for the next jobs
+                for c, version, _, _ in group:
+                    self.done(c, version)  # so that the curves can be submitted again
+                continue
+            self.on_result([(c, version, t, curve_points)
+                            for (c, version, _, _), (t, curve_points) in zip(group, samples)])
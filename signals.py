@@ -13,12 +13,14 @@ class Signals(QtCore.QObject):
 
     hull_selection = QtCore.pyqtSignal([bool])
 
+    update_tolerance = QtCore.pyqtSignal([float])
+    update_spacing = QtCore.pyqtSignal([float])  # 0 for adaptive sampling
+
     change_curve = QtCore.pyqtSignal()
+    select_curve = QtCore.pyqtSignal([int])
     delete_curves = QtCore.pyqtSignal([list])
-    add_curve_to_widget = QtCore.pyqtSignal()
+    curves_added = QtCore.pyqtSignal([int, int])  # first index, count
     add_curve_to_backend = QtCore.pyqtSignal()
 
-    new_point = QtCore.pyqtSignal()
-    delete_point = QtCore.pyqtSignal([int])
-    change_weight = QtCore.pyqtSignal([int, float])
-    change_weights = QtCore.pyqtSignal([list])
+    load_progress = QtCore.pyqtSignal([float])
+    curves_computed = QtCore.pyqtSignal([list])  # emitted from worker threads, see Canvas.apply_samples
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+
+class GridIndex(object):
+    """Uniform grid over 2D points stored under hashable keys."""
+
+    def __init__(self, cell=32):
+        self.cell = float(cell)
+        self.cells = {}  # (column, row) -> {key: (x, y)}
+        self.keys = {}  # key -> (column, row)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def cell_of(self, p):
+        return int(p[0] // self.cell), int(p[1] // self.cell)
+
+    def insert(self, key, p):
+        c = self.cell_of(p)
+        self.cells.setdefault(c, {})[key] = (float(p[0]), float(p[1]))
+        self.keys[key] = c
+
+    def remove(self, key):
+        c = self.keys.pop(key, None)
+        if c is not None:
+            bucket = self.cells[c]
+            del bucket[key]
+            if not bucket:
+                del self.cells[c]
+
+    def move(self, key, p):
+        self.remove(key)
+        self.insert(key, p)
+
+    def nearest(self, p, radius, accept=None):
+        """Key of the point closest to p within radius and its squared distance,
+        (None, inf) when there is none. accept filters candidate keys."""
+        x, y = float(p[0]), float(p[1])
+        (c0, r0), (c1, r1) = self.cell_of((x - radius, y - radius)), self.cell_of((x + radius, y + radius))
+        best, best_d = None, float('inf')
+        for c in xrange(c0, c1 + 1):
+            for r in xrange(r0, r1 + 1):
+                for key, (px, py) in self.cells.get((c, r), {}).iteritems():
+                    d = (px - x) ** 2 + (py - y) ** 2
+                    if d < best_d and d <= radius ** 2 and (accept is None or accept(key)):
+                        best, best_d = key, d
+        return best, best_d
+
+
+class CurveGridIndex(GridIndex):
+    """Points of many curves kept up to date through Curve.subscribe. Curves
+    that come with cached bounds, like those of document.load, are indexed
+    lazily: only the box of their points is recorded and the points are read
+    by the first query that reaches it. Subclasses define index_curve,
+    drop_curve and curve_changed, which starts with index_pending."""
+    wide = 64  # boxes over more cells are not put in cells, every query checks them
+
+    def __init__(self, cell=32):
+        super(CurveGridIndex, self).__init__(cell)
+        self.pending = {}  # curve -> box of its points, not indexed yet
+        self.pending_cells = {}  # (column, row) -> set of pending curves with a box over it
+        self.pending_wide = set()
+
+    def add_curve(self, curve):
+        curve.subscribe(self.curve_changed)
+        box = curve.bounds
+        if box:
+            self.pending[curve] = box
+            cells = self.box_cells(box)
+            if cells is None:
+                self.pending_wide.add(curve)
+            for c in cells or ():
+                self.pending_cells.setdefault(c, set()).add(curve)
+        else:
+            self.index_curve(curve)
+
+    def remove_curve(self, curve):
+        curve.unsubscribe(self.curve_changed)
+        if not self.unpend(curve):
+            self.drop_curve(curve)
+
+    def box_cells(self, box):
+        """Cells covered by box (xmin, ymin, xmax, ymax), None if there are more than wide."""
+        (c0, r0), (c1, r1) = self.cell_of(box[:2]), self.cell_of(box[2:])
+        if (c1 - c0 + 1) * (r1 - r0 + 1) > self.wide:
+            return None
+        return [(c, r) for c in xrange(c0, c1 + 1) for r in xrange(r0, r1 + 1)]
+
+    def unpend(self, curve):
+        """Forgets the box of curve, False if it was indexed already."""
+        box = self.pending.pop(curve, None)
+        if box is None:
+            return False
+        for c in self.box_cells(box) or ():
+            bucket = self.pending_cells[c]
+            bucket.discard(curve)
+            if not bucket:
+                del self.pending_cells[c]
+        self.pending_wide.discard(curve)
+        return True
+
+    def index_pending(self, curve):
+        """Indexes curve if it was pending, returns whether it was."""
+        if self.unpend(curve):
+            self.index_curve(curve)
+            return True
+        return False
+
+    def nearest(self, p, radius, accept=None):
+        if self.pending:
+            x, y = float(p[0]), float(p[1])
+            (c0, r0), (c1, r1) = self.cell_of((x - radius, y - radius)), self.cell_of((x + radius, y + radius))
+            near = set(curve for curve in self.pending_wide
+                       if self.pending[curve][0] <= x + radius and x - radius <= self.pending[curve][2]
+                       and self.pending[curve][1] <= y + radius and y - radius <= self.pending[curve][3])
+            for c in xrange(c0, c1 + 1):
+                for r in xrange(r0, r1 + 1):
+                    near.update(self.pending_cells.get((c, r), ()))
+            for curve in near:
+                self.index_pending(curve)
+        return super(CurveGridIndex, self).nearest(p, radius, accept)
+
+
+class ControlPointIndex(CurveGridIndex):
+    """Control points of many curves, keyed by (curve, point index)."""
+
+    def __init__(self, cell=32):
+        super(ControlPointIndex, self).__init__(cell)
+        self.sizes = {}  # curve -> number of indexed points
+
+    def index_curve(self, curve):
+        for i, p in enumerate(curve.control_points):
+            self.insert((curve, i), p)
+        self.sizes[curve] = len(curve.control_points)
+
+    def drop_curve(self, curve):
+        for i in xrange(self.sizes.pop(curve, 0)):
+            self.remove((curve, i))
+
+    def curve_changed(self, curve, event, i=None):
+        if event == 'transform' or self.index_pending(curve):
+            return  # points only move once the transform is applied
+        elif event == 'change':
+            self.move((curve, i), curve.control_points[i])
+        elif event == 'insert' and i == self.sizes.get(curve):
+            self.insert((curve, i), curve.control_points[i])
+            self.sizes[curve] += 1
+        else:
+            self.drop_curve(curve)
+            self.index_curve(curve)
+
+
+class EndpointIndex(CurveGridIndex):
+    """First and last control points of many curves, keyed by (curve, head)
+    with head 0 or -1."""
+
+    def index_curve(self, curve):
+        for head in (0, -1):
+            if len(curve.control_points):
+                self.move((curve, head), curve.control_points[head])
+            else:
+                self.remove((curve, head))
+
+    def drop_curve(self, curve):
+        self.remove((curve, 0))
+        self.remove((curve, -1))
+
+    def curve_changed(self, curve, event, i=None):
+        if event != 'transform' and not self.index_pending(curve):
+            self.index_curve(curve)
+
+    def nearest_foreign(self, curve, radius):
+        """Closest endpoint of another curve to either end of curve, returned as
+        ((other curve, other head), head of curve), None if none is within radius.
+        The pending transform of curve is taken into account."""
+        best, best_d = None, float('inf')
+        ends = curve.transformed(curve.control_points[[0, -1]])
+        for head, p in zip((0, -1), ends):
+            key, d = self.nearest(p, radius, accept=lambda k: k[0] is not curve)
+            if d < best_d:
+                best, best_d = (key, head), d
+        return best
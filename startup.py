@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Startup time breakdown printed by bezier_editor.py --startup-profile."""
+import __builtin__
+import sys
+import time
+from contextlib import contextmanager
+
+
+class StartupTimings(object):
+    """Self times of first imports, per module, and build times of widgets.
+    Does nothing until enable() is called."""
+
+    def __init__(self):
+        self.enabled = False
+        self.start = time.time()
+        self.records = []  # (kind, name, seconds)
+        self.children = []  # time spent in nested imports, one entry per import in progress
+        self.original_import = None
+
+    def enable(self):
+        self.enabled = True
+        self.original_import = __builtin__.__import__
+        __builtin__.__import__ = self.timed_import
+
+    def disable(self):
+        if self.original_import is not None:
+            __builtin__.__import__ = self.original_import
+            self.original_import = None
+
+    def timed_import(self, name, *args, **kwargs):
+        if name in sys.modules:
+            return self.original_import(name, *args, **kwargs)
+        self.children.append(0.)
+        t0 = time.time()
+        try:
+            return self.original_import(name, *args, **kwargs)
+        finally:
+            total = time.time() - t0
+            own = total - self.children.pop()
+            if self.children:
+                self.children[-1] += total
+            self.records.append(('module', name, own))
+
+    @contextmanager
+    def measure(self, kind, name):
+        if not self.enabled:
+            yield
+            return
+        t0 = time.time()
+        try:
+            yield
+        finally:
+            self.records.append((kind, name, time.time() - t0))
+
+    def report(self, out=None, limit=15):
+        """Prints the slowest records of each kind and the time since start."""
+        out = out or sys.stderr
+        for kind in ('module', 'widget'):
+            records = sorted((r for r in self.records if r[0] == kind), key=lambda r: -r[2])
+            out.write('{} ({} total, {:.1f} ms):\n'.format(kind, len(records), 1000 * sum(r[2] for r in records)))
+            for _, name, seconds in records[:limit]:
+                out.write('  {:8.1f} ms  {}\n'.format(1000 * seconds, name))
+        out.write('startup: {:.1f} ms\n'.format(1000 * (time.time() - self.start)))
+
+
+timings = StartupTimings()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# coding: utf-8
+import numpy as np
+
+
+class CurveStore(object):
+    """Control points and weights of many curves kept in two contiguous float64
+    arrays. Every curve owns a slot: rows [offset, offset + capacity) of which
+    the first length rows are in use. Slots that outgrow their capacity move to
+    the end of the arrays, the holes they leave are squeezed out by compact()."""
+
+    def __init__(self, capacity=256):
+        self.points = np.zeros((capacity, 2))
+        self.weights = np.ones(capacity)
+        self.offsets = []
+        self.lengths = []
+        self.capacities = []
+        self.free_slots = []
+        self.end = 0  # first row not owned by any slot
+        self.waste = 0  # rows owned by no live slot below end
+
+    @classmethod
+    def from_arrays(cls, points, weights, offsets, lengths):
+        """Store using points and weights as they are (memory maps included),
+        with one full slot per pair of offsets and lengths."""
+        store = cls(capacity=0)
+        store.points, store.weights = points, weights
+        store.offsets = [int(offset) for offset in offsets]
+        store.lengths = [int(n) for n in lengths]
+        store.capacities = list(store.lengths)
+        store.end = max([offset + n for offset, n in zip(store.offsets, store.lengths)] or [0])
+        store.waste = store.end - sum(store.lengths)
+        return store
+
+    def __len__(self):
+        return len(self.offsets) - len(self.free_slots)
+
+    def reserve(self, rows):
+        """Makes room for rows more rows after end."""
+        if self.end + rows > len(self.points):
+            if self.waste > self.end // 2:
+                self.compact()
+            if self.end + rows > len(self.points):
+                size = max(2 * len(self.points), self.end + rows)
+                points, weights = np.zeros((size, 2)), np.ones(size)
+                points[:self.end], weights[:self.end] = self.points[:self.end], self.weights[:self.end]
+                self.points, self.weights = points, weights
+
+    def allocate(self, points=(), weights=None):
+        points = np.array(points, dtype=float).reshape((-1, 2))
+        n = len(points)
+        capacity = max(n, 4)
+        self.reserve(capacity)
+        if self.free_slots:
+            slot = self.free_slots.pop()
+            self.offsets[slot], self.lengths[slot], self.capacities[slot] = self.end, n, capacity
+        else:
+            slot = len(self.offsets)
+            self.offsets.append(self.end)
+            self.lengths.append(n)
+            self.capacities.append(capacity)
+        self.end += capacity
+        self.assign(slot, points, weights)
+        return slot
+
+    def release(self, slot):
+        self.waste += self.capacities[slot]
+        self.lengths[slot] = self.capacities[slot] = 0
+        self.free_slots.append(slot)
+
+    def resize(self, slot, n):
+        """Changes the number of points of slot, keeping the leading ones."""
+        if n > self.capacities[slot]:
+            self.reserve(max(n, 2 * self.capacities[slot]))
+            offset, length, capacity = self.offsets[slot], self.lengths[slot], self.capacities[slot]
+            if offset + capacity != self.end:
+                end = self.end
+                self.points[end:end + length] = self.points[offset:offset + length]
+                self.weights[end:end + length] = self.weights[offset:offset + length]
+                self.waste += capacity
+                self.offsets[slot] = offset = end
+            self.capacities[slot] = max(n, 2 * capacity)
+            self.end = offset + self.capacities[slot]
+        offset, length = self.offsets[slot], self.lengths[slot]
+        self.weights[offset + length:offset + n] = 1.
+        self.lengths[slot] = n
+
+    def get_points(self, slot):
+        offset = self.offsets[slot]
+        return self.points[offset:offset + self.lengths[slot]]
+
+    def get_weights(self, slot):
+        offset = self.offsets[slot]
+        return self.weights[offset:offset + self.lengths[slot]]
+
+    def assign(self, slot, points, weights=None):
+        points = np.array(points, dtype=float).reshape((-1, 2))  # copied, resize may move the rows of a view
+        weights = None if weights is None else np.array(weights, dtype=float)
+        self.resize(slot, len(points))
+        self.get_points(slot)[:] = points
+        self.get_weights(slot)[:] = 1. if weights is None else weights
+
+    def insert(self, slot, i, p, w=1.):
+        p = np.array(p, dtype=float)
+        n = self.lengths[slot]
+        i = min(i if i >= 0 else max(n + i, 0), n)
+        self.resize(slot, n + 1)
+        points, weights = self.get_points(slot), self.get_weights(slot)
+        points[i + 1:], weights[i + 1:] = points[i:-1].copy(), weights[i:-1].copy()
+        points[i], weights[i] = p, w
+
+    def pop(self, slot, i):
+        points, weights = self.get_points(slot), self.get_weights(slot)
+        p, w = points[i].copy(), weights[i]
+        i = i if i >= 0 else len(points) + i
+        points[i:-1], weights[i:-1] = points[i + 1:].copy(), weights[i + 1:].copy()
+        self.resize(slot, len(points) - 1)
+        return p, w
+
+    def compact(self):
+        """Packs live slots to the front of the arrays, in slot order."""
+        live = [slot for slot in xrange(len(self.offsets)) if self.capacities[slot]]
+        rows = self.rows(live, capacity=True)
+        self.points[:len(rows)], self.weights[:len(rows)] = self.points[rows], self.weights[rows]
+        offset = 0
+        for slot in live:
+            self.offsets[slot] = offset
+            offset += self.capacities[slot]
+        self.end, self.waste = offset, 0
+
+    def rows(self, slots, capacity=False):
+        """Indices of the rows used (or owned) by slots, concatenated in order."""
+        sizes = np.asarray(self.capacities if capacity else self.lengths, dtype=int)[slots]
+        starts = np.asarray(self.offsets, dtype=int)[slots]
+        if not len(sizes):
+            return np.zeros(0, dtype=int)
+        return np.repeat(starts - np.cumsum(sizes) + sizes, sizes) + np.arange(sizes.sum())
+
+    def export(self, slots):
+        """Curve numbers, points and weights of slots as three aligned arrays."""
+        rows = self.rows(slots)
+        ids = np.repeat(np.arange(len(slots)), np.asarray(self.lengths, dtype=int)[slots])
+        return ids, self.points[rows], self.weights[rows]
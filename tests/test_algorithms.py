@@ -1,5 +1,8 @@
-from algorithms import prod, outer, casteljau, degree_elevation, degree_reduction, split_bezier
+from algorithms import prod, outer, casteljau, degree_elevation, degree_reduction, split_bezier, \
+    bernstein, bernstein_basis, casteljau_batch, subdivision_matrices, flatten, subdivide, \
+    project, derivatives, convex_hull, arc_length_table, t_at_length, arc_length_samples
 import numpy as np
+import pytest
 
 
 def test_prod():
@@ -23,6 +26,16 @@ def test_casteljau():
     np.testing.assert_array_equal(result, casteljau(t, p))
 
 
+def test_bernstein_partition_of_unity():
+    np.testing.assert_array_almost_equal(np.ones(7), bernstein(4, np.linspace(0, 1, 7)).sum(axis=1))
+
+
+def test_bernstein_basis_is_cached():
+    t, B = bernstein_basis(3, 11)
+    assert B is bernstein_basis(3, 11)[1]
+    np.testing.assert_array_equal(bernstein(3, t), B)
+
+
 def test_casteljau_with_weights():
     t = np.linspace(0, 1, 5)
     p = np.array([[10, 10], [20, 10], [20, 20]]).T
@@ -163,3 +176,124 @@ def test_degree_reduction_non_matching_with_weights():
     np.testing.assert_array_almost_equal(expected_new_control_points, new_points, decimal=6)
     np.testing.assert_array_almost_equal(expected_new_weights, new_weights, decimal=6)
 
+
+
+def test_casteljau_batch_matches_casteljau():
+    t = np.linspace(0, 1, 5)
+    ps = [np.array([[10, 10], [20, 10], [20, 20]]), np.array([[0, 0], [0, 1], [1, 2], [2, 1], [2, 0]]),
+          np.array([[1, 1], [2, 5], [3, 3]]), np.array([[4, 4]])]
+    ws = [[.5, 1, 1], None, [1, 2, 1], [1]]
+
+    result = casteljau_batch(t, ps, ws)
+    for p, w, r in zip(ps[:3], ws[:3], result[:3]):
+        np.testing.assert_array_almost_equal(casteljau(t, p.T, weights=w), r)
+    np.testing.assert_array_equal(ps[3], result[3])
+
+
+def test_subdivision_matrices():
+    p = np.array([[0, 0], [0, 1], [1, 2], [2, 1], [2, 0]])
+    L, R = subdivision_matrices(4, .5)
+    np.testing.assert_array_equal(np.array([[0., 0.], [0., 0.5], [0.25, 1.], [0.625, 1.25], [1., 1.25]]), L.dot(p))
+    np.testing.assert_array_equal(np.array([[1., 1.25], [1.375, 1.25], [1.75, 1.], [2., 0.5], [2., 0.]]), R.dot(p))
+
+
+def test_flatten_line_needs_only_end_points():
+    t, points = flatten(np.array([[0, 0], [5, 5], [10, 10]]))
+    np.testing.assert_array_equal(np.array([0., 1.]), t)
+    np.testing.assert_array_equal(np.array([[0, 0], [10, 10]]), points)
+
+
+def test_flatten_within_tolerance():
+    p = np.array([[0, 0], [0, 100], [100, 200], [200, 100], [200, 0]])
+    w = [1, 2, 1, 2, 1]
+    t, points = flatten(p, w, tolerance=.5)
+    np.testing.assert_array_almost_equal(casteljau(t, p.T, weights=w), points)
+
+    dense_t = np.linspace(0, 1, 2001)
+    dense = casteljau(dense_t, p.T, weights=w)
+    idx = np.clip(np.searchsorted(t, dense_t, side='right') - 1, 0, len(t) - 2)
+    a, b = points[idx], points[idx + 1]
+    u = np.clip(((dense - a) * (b - a)).sum(axis=1) / ((b - a) ** 2).sum(axis=1), 0, 1)
+    assert np.sqrt(((a + u[:, None] * (b - a) - dense) ** 2).sum(axis=1)).max() <= .5
+    assert len(t) < 1000
+
+
+def test_flatten_follows_overshoot_past_the_chord():
+    p = np.array([[0, 0], [200, 0], [100, 0]])  # collinear, turns back at x = 133.3
+    t, points = flatten(p, tolerance=.5)
+    assert len(t) > 2
+    assert abs(points[:, 0].max() - 400. / 3) <= .5
+
+
+
+def test_subdivide_into_pieces():
+    p = np.array([[0, 0], [0, 1], [1, 2], [2, 1], [2, 0]])
+    w = [1, 2, 1, 2, 1]
+    pieces = subdivide(p, [.75, .25, .5], w)
+    assert 4 == len(pieces)
+
+    t = np.linspace(0, 1, 9)
+    for (points, weights), (a, b) in zip(pieces, [(0, .25), (.25, .5), (.5, .75), (.75, 1)]):
+        np.testing.assert_array_almost_equal(casteljau(a + (b - a) * t, p.T, weights=w),
+                                             casteljau(t, points.T, weights=weights))
+
+
+def test_subdivide_rejects_end_points_and_repeats():
+    p = np.array([[0, 0], [1, 2], [2, 0]])
+    assert 2 == len(subdivide(p, [.5, .5]))
+    for t in (0., 1., [.5, 1.], []):
+        with pytest.raises(ValueError):
+            subdivide(p, t)
+
+
+def test_project_finds_closest_point():
+    p = np.array([[0, 0], [0, 100], [100, 200], [200, 100], [200, 0]])
+    w = [1, 2, 1, 2, 1]
+    q = np.array([120, 80])
+    t, dist = project(q, p, w)
+
+    dense = casteljau(np.linspace(0, 1, 100001), p.T, weights=w)
+    assert dist <= np.sqrt(((dense - q) ** 2).sum(axis=1)).min()
+    np.testing.assert_almost_equal(dist, np.sqrt(((casteljau(t, p.T, weights=w) - q) ** 2).sum()))
+
+
+def test_derivatives_match_finite_differences():
+    p = np.array([[0, 0], [0, 1], [1, 2], [2, 1]])
+    w = [1, 2, .5, 1]
+    t, h = np.array([.3]), 1e-5
+    c, c1, c2 = derivatives(t, p, w)
+    before, after = casteljau(t - h, p.T, weights=w), casteljau(t + h, p.T, weights=w)
+    np.testing.assert_array_almost_equal((after - before) / (2 * h), c1, decimal=5)
+    np.testing.assert_array_almost_equal((after - 2 * c + before) / h ** 2, c2, decimal=3)
+
+
+def test_convex_hull_monotone_chain_matches_qhull():
+    points = np.random.RandomState(0).rand(40, 2)
+    small, large = convex_hull(points), convex_hull(points, qhull_from=3)
+    np.testing.assert_array_equal(small[0], small[-1])
+    assert sorted(map(tuple, small[:-1])) == sorted(map(tuple, large[:-1]))
+
+
+def test_convex_hull_of_collinear_points():
+    np.testing.assert_array_equal(np.array([[0, 0], [2, 2], [0, 0]]), convex_hull([[0, 0], [1, 1], [2, 2]]))
+
+
+def test_arc_length_of_quarter_circle():
+    p = np.array([[10., 0.], [10., 10.], [0., 10.]])
+    w = [1., np.sqrt(.5), 1.]
+    table = arc_length_table(p, w)
+    np.testing.assert_almost_equal(table[1][-1], 5 * np.pi)
+
+    t = t_at_length([0., 2.5 * np.pi, 5 * np.pi], table, p, w)
+    np.testing.assert_array_almost_equal([[10., 0.], [np.sqrt(50), np.sqrt(50)], [0., 10.]],
+                                         casteljau(t, p.T, weights=w))
+
+
+def test_arc_length_samples_are_evenly_spaced():
+    p = np.array([[0, 0], [0, 100], [10, 0], [100, 10]])
+    w = [1, 3, .5, 1]
+    t, points = arc_length_samples(p, w, spacing=4.)
+    np.testing.assert_array_almost_equal(points, casteljau(t, p.T, weights=w))
+    arcs = np.diff(np.interp(t, *arc_length_table(p, w, segments=4096)))
+    assert arcs.max() <= 4.
+    np.testing.assert_array_almost_equal(arcs, arcs.mean(), decimal=3)
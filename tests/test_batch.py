@@ -0,0 +1,29 @@
+import numpy as np
+import batch
+from curve import Curve
+
+
+def test_process_file(tmpdir):
+    src = tmpdir.join('curves.csv')
+    np.savetxt(str(src), [[0, 0., 0., 1.], [0, 10., 20., 2.], [0, 30., 0., 1.]], delimiter=',')
+    options = {'output': str(tmpdir.mkdir('out')), 'split': .5, 'elevate': 1, 'reduce': 0, 'samples': 0}
+
+    out = batch.process_file((str(src), options))
+    arr = np.loadtxt(out, delimiter=',')
+    assert [0, 0, 0, 0, 1, 1, 1, 1] == arr[:, 0].tolist()
+    np.testing.assert_array_almost_equal(arr[3, 1:3], arr[4, 1:3])  # pieces meet
+
+    options['samples'] = 5
+    arr = np.loadtxt(batch.process_file((str(src), options)), delimiter=',')
+    assert (10, 3) == arr.shape
+
+
+def test_process_file_evaluates_only_the_output(tmpdir, monkeypatch):
+    src = tmpdir.join('curves.csv')
+    np.savetxt(str(src), [[0, 0., 0., 1.], [0, 10., 20., 2.], [0, 30., 0., 1.]], delimiter=',')
+    options = {'output': str(tmpdir.mkdir('out')), 'split': .5, 'elevate': 2, 'reduce': 1, 'samples': 0}
+    computed = []
+    monkeypatch.setattr(Curve, 'set_curve_points', lambda self, t, curve_points: computed.append(len(t)))
+
+    batch.process_file((str(src), options))
+    assert not computed
@@ -0,0 +1,31 @@
+import numpy as np
+import csv_format
+
+
+def test_group_curves_adds_unit_weights():
+    arr = np.array([[0, 1., 2.], [0, 3., 4.], [1, 5., 6.]])
+    (p0, w0), (p1, w1) = csv_format.group_curves(arr)
+    assert [[1., 2.], [3., 4.]] == p0.tolist()
+    assert [1., 1.] == w0.tolist()
+    assert [[5., 6.]] == p1.tolist()
+
+
+def test_group_curves_sorts_only_unordered_rows():
+    arr = np.array([[1, 5., 6., 1.], [0, 1., 2., 1.], [1, 7., 8., 2.]])
+    (p0, _), (p1, w1) = csv_format.group_curves(arr)
+    assert [[1., 2.]] == p0.tolist()
+    assert [[5., 6.], [7., 8.]] == p1.tolist()
+    assert [1., 2.] == w1.tolist()
+    assert [] == csv_format.group_curves(np.zeros((0, 4)))
+
+
+def test_read_csv_chunks(tmpdir):
+    src = tmpdir.join('curves.csv')
+    rows = [[0, 1, 1], [0, 2, 2], [0, 3, 3], [1, 4, 4], [1, 5, 5], [2, 6, 6], [0, 7, 7]]
+    np.savetxt(str(src), rows, delimiter=',')
+
+    chunks = list(csv_format.read_csv_chunks(str(src), chunk_rows=2))
+    curves = [(i, points.tolist()) for runs, _ in chunks for i, points, _ in runs]
+    assert [(0, [[1, 1], [2, 2], [3, 3]]), (1, [[4, 4], [5, 5]]), (2, [[6, 6]]), (0, [[7, 7]])] == curves
+    assert 1. == chunks[-1][1]
+    assert sorted(progress for _, progress in chunks) == [progress for _, progress in chunks]
@@ -1,6 +1,8 @@
 import pytest
+import numpy as np
 from mock import sentinel, mock
 import curve
+from algorithms import casteljau
 from curve import Curve
 
 
@@ -15,15 +17,15 @@ def basic_curve_parameters():
 
 
 @pytest.fixture
-def basic_curve(basic_curve_parameters):
-    Curve.compute = mock.Mock()
+def basic_curve(basic_curve_parameters, monkeypatch):
+    monkeypatch.setattr(Curve, 'compute', mock.Mock())
     curve = Curve(**basic_curve_parameters)
     return curve
 
 
 class TestCurveInit:
     def test_init_empty_curve(self, basic_curve, basic_curve_parameters):
-        assert [] == basic_curve.control_points
+        assert 0 == len(basic_curve.control_points)
         assert basic_curve_parameters['curve_color'] == basic_curve.curve_color
         assert basic_curve_parameters['points_color'] == basic_curve.points_color
         assert basic_curve_parameters['hull_color'] == basic_curve.hull_color
@@ -33,52 +35,170 @@ class TestCurveInit:
 
 class TestCurveAppend:
     def test_basic_append(self, basic_curve):
-        point = (sentinel.x, sentinel.y)
+        point = (1., 2.)
         basic_curve.append(point)
-        assert point in basic_curve.control_points
+        assert point == tuple(basic_curve.control_points[-1])
+        assert [1.] == basic_curve.weights.tolist()
 
 
 class TestCurveInsert:
     def test_basic_insert(self, basic_curve):
-        basic_curve.control_points = [(sentinel.xa, sentinel.ya), (sentinel.xc, sentinel.yc)]
+        basic_curve.control_points = [(1., 2.), (5., 6.)]
         index = 1
-        point = (sentinel.xb, sentinel.yb)
+        point = (3., 4.)
 
         basic_curve.insert(index, point)
-        assert point in basic_curve.control_points
-        assert point == basic_curve.control_points[index]
+        assert [(1., 2.), point, (5., 6.)] == list(map(tuple, basic_curve.control_points))
+        assert point == tuple(basic_curve.control_points[index])
+
+
+class TestCurveExtend:
+    def test_basic_extend(self, basic_curve):
+        basic_curve.control_points = [(1., 2.)]
+        basic_curve.extend([(3., 4.), (5., 6.)], [2., 3.])
+        assert [[1., 2.], [3., 4.], [5., 6.]] == basic_curve.control_points.tolist()
+        assert [1., 2., 3.] == basic_curve.weights.tolist()
 
 
 class TestCurvePop:
     def test_basic_pop(self, basic_curve):
-        point = (sentinel.xb, sentinel.yb)
-        weight = sentinel.b
-        basic_curve.control_points = [(sentinel.xa, sentinel.ya), point, (sentinel.xc, sentinel.yc)]
-        basic_curve.weights = [sentinel.a, weight, sentinel.c]
+        point = (3., 4.)
+        weight = 2.
+        basic_curve.control_points = [(1., 2.), point, (5., 6.)]
+        basic_curve.weights = [.5, weight, 3.]
         index = 1
 
         result = basic_curve.pop(index)
-        assert point not in basic_curve.control_points
-        assert weight not in basic_curve.weights
-        assert point == result
+        assert [(1., 2.), (5., 6.)] == list(map(tuple, basic_curve.control_points))
+        assert [.5, 3.] == basic_curve.weights.tolist()
+        assert point == tuple(result)
 
 
 class TestCurveChange:
     def test_basic_change(self, basic_curve):
-        point = (sentinel.xb, sentinel.yb)
-        basic_curve.control_points = [(sentinel.xa, sentinel.ya), point, (sentinel.xc, sentinel.yc)]
+        point = (3., 4.)
+        basic_curve.control_points = [(1., 2.), (7., 7.), (5., 6.)]
         index = 1
 
         basic_curve.change(index, point)
-        assert point == basic_curve.control_points[index]
+        assert point == tuple(basic_curve.control_points[index])
+
+    @pytest.mark.parametrize('weights', [[1., 1., 1.], [1., 2., .5]])
+    def test_incremental_change(self, basic_curve, weights):
+        basic_curve.control_points = [[0, 0], [10, 20], [30, 0]]
+        basic_curve.weights = weights[:]
+        basic_curve.curve_t = np.linspace(0, 1, 11)
+        basic_curve.curve_points = casteljau(basic_curve.curve_t, np.array(basic_curve.control_points).T,
+                                             weights=weights)
+
+        basic_curve.change(1, p=(20, 40))
+        basic_curve.change(2, w=3.)
+        expected = casteljau(basic_curve.curve_t, np.array([[0, 0], [20, 40], [30, 0]]).T,
+                             weights=weights[:2] + [3.])
+        np.testing.assert_array_almost_equal(expected, basic_curve.curve_points)
+        assert not basic_curve.compute.called
+
+    @pytest.mark.parametrize('sampling', [{'tolerance': .5}, {'spacing': 2.}])
+    def test_adaptive_change_recomputes(self, basic_curve, sampling):
+        basic_curve.control_points = [[0, 0], [10, 20], [30, 0]]
+        basic_curve.curve_t = np.linspace(0, 1, 11)
+        basic_curve.curve_points = casteljau(basic_curve.curve_t, np.array(basic_curve.control_points).T)
+        basic_curve.tolerance = sampling.get('tolerance')
+        basic_curve.spacing = sampling.get('spacing')
+
+        basic_curve.change(1, p=(20, 40))
+        assert basic_curve.compute.called
+
+
+class TestCurveChangeWeights:
+    @pytest.mark.parametrize('weights', [[1., 1., 1., 1.], [1., 2., .5, 1.]])
+    def test_change_weights(self, basic_curve, weights):
+        basic_curve.control_points = [[0, 0], [10, 20], [30, 0], [40, 10]]
+        basic_curve.weights = weights[:]
+        basic_curve.curve_t = np.linspace(0, 1, 11)
+        basic_curve.curve_points = casteljau(basic_curve.curve_t, basic_curve.control_points.T, weights=weights)
+        events = []
+        basic_curve.subscribe(lambda c, event, i: events.append((event, i)))
+
+        basic_curve.change_weights({2: 3., 0: 2., 1: 0})
+        basic_curve.change_weights({3: 4.})
+        expected = casteljau(basic_curve.curve_t, basic_curve.control_points.T, weights=[2., weights[1], 3., 4.])
+        np.testing.assert_array_almost_equal(expected, basic_curve.curve_points)
+        assert [('change', 0), ('change', 2), ('change', 3)] == events
+        assert not basic_curve.compute.called
+
+    def test_change_weights_of_adaptive_curve_recomputes(self, basic_curve):
+        basic_curve.control_points = [[0, 0], [10, 20], [30, 0]]
+        basic_curve.curve_t = np.linspace(0, 1, 11)
+        basic_curve.curve_points = casteljau(basic_curve.curve_t, basic_curve.control_points.T)
+        basic_curve.tolerance = .5
+
+        basic_curve.change_weights({1: 3.})
+        assert basic_curve.compute.called
+        assert [1., 3., 1.] == basic_curve.weights.tolist()
+
+
+class TestCurvePreview:
+    def test_preview_then_change(self, basic_curve):
+        basic_curve.control_points = [[0, 0], [10, 20], [30, 0]]
+        basic_curve.weights = [1., 2., 1.]
+
+        basic_curve.preview(5)
+        basic_curve.change(1, p=(20, 40))
+        expected = casteljau(np.linspace(0, 1, 5), np.array([[0, 0], [20, 40], [30, 0]]).T, weights=[1., 2., 1.])
+        np.testing.assert_array_almost_equal(expected, basic_curve.curve_points)
+
+
+class TestCurveArcLength:
+    def test_length_follows_changes(self):
+        c = Curve(control_points=[[0., 0.], [30., 40.]])
+        assert 50. == pytest.approx(c.length())
+        np.testing.assert_array_almost_equal([6., 8.], c.point_at_length(10.))
+        table = c.arc_length_table()
+        assert table[1] is c.arc_length_table()[1]  # cached
+
+        c.change(1, p=(0., 20.))
+        assert 20. == pytest.approx(c.length())
+        np.testing.assert_array_almost_equal([[0., 5.], [0., 20.]], c.point_at_length([5., 30.]))
+
+    def test_compute_after_mutation_uses_new_table(self):
+        c = Curve(control_points=[[0., 0.], [30., 40.]], spacing=10.)
+        assert 50. == pytest.approx(c.length())
+        c.append((60., 80.))  # evaluated before the append is notified
+        assert 100. == pytest.approx(c.length())
+        assert 10 == len(c.curve_points) - 1
+
+    def test_uniform_spacing(self):
+        c = Curve(control_points=[[0., 0.], [0., 50.], [50., 50.]], spacing=2.)
+        steps = np.sqrt((np.diff(c.curve_points, axis=0) ** 2).sum(axis=1))
+        assert steps.max() <= 2. and steps.max() - steps.min() < .01
+        assert 2. == c.split(.5).spacing
+
+
+class TestCurveTransform:
+    def test_pending_until_applied(self, basic_curve):
+        basic_curve.control_points = [[0., 0.], [10., 0.], [10., 10.]]
+        basic_curve.calculate_center()
+
+        basic_curve.translate(-5., 0.)
+        basic_curve.rotate(np.pi / 2)
+        assert [[0., 0.], [10., 0.], [10., 10.]] == basic_curve.control_points.tolist()
+        np.testing.assert_array_almost_equal([[10., 5.], [10., 15.], [0., 15.]],
+                                             basic_curve.transformed(basic_curve.control_points))
+
+        basic_curve.apply_transform()
+        assert basic_curve.pending_transform is None
+        np.testing.assert_array_almost_equal([[10., 5.], [10., 15.], [0., 15.]], basic_curve.control_points)
 
 
 class TestCurveCopy:
     def test_basic_change(self, basic_curve):
-        basic_curve.control_points = [(sentinel.xa, sentinel.ya)]
+        basic_curve.control_points = [(1., 2.)]
 
         new_curve = basic_curve.copy()
-        assert new_curve.control_points == basic_curve.control_points
+        np.testing.assert_array_equal(basic_curve.control_points, new_curve.control_points)
+        assert new_curve.store is basic_curve.store
+        assert new_curve.slot != basic_curve.slot
         assert new_curve.curve_color == basic_curve.curve_color
         assert new_curve.points_color == basic_curve.points_color
         assert new_curve.hull_color == basic_curve.hull_color
@@ -88,17 +208,35 @@ class TestCurveCopy:
 
 class TestCurveSplit:
     def test_basic_split(self, basic_curve):
-        points = [[sentinel.xa, sentinel.ya], [sentinel.xb, sentinel.yb]] * 2
+        points = [[1., 2.], [3., 4.]]
+        weights = [.5, 2.]
         basic_curve.control_points = points
-        curve.split_bezier = lambda a, x, by, w: x
+        basic_curve.weights = weights
+        curve.subdivide = lambda p, t, w: [(p[:1].copy(), w[:1].copy()), (p[1:].copy(), w[1:].copy())]
 
-        new_curve = basic_curve.split(sentinel.index)
+        new_curve = basic_curve.split(sentinel.t)
 
-        assert new_curve.control_points == points[1]
-        assert basic_curve.control_points == points[0]
+        assert points[1:] == new_curve.control_points.tolist()
+        assert weights[1:] == new_curve.weights.tolist()
+        assert points[:1] == basic_curve.control_points.tolist()
+        assert weights[:1] == basic_curve.weights.tolist()
 
         assert new_curve.curve_color == basic_curve.curve_color
         assert new_curve.points_color == basic_curve.points_color
         assert new_curve.hull_color == basic_curve.hull_color
         assert new_curve.size == basic_curve.size
         assert new_curve.hull_selection == basic_curve.hull_selection
+
+
+class TestCurveStore:
+    def test_curves_share_store(self, basic_curve):
+        basic_curve.control_points = [(1., 2.), (3., 4.)]
+        other = basic_curve.copy()
+        other.append((5., 6.))
+        other.pop(0)
+
+        assert [[1., 2.], [3., 4.]] == basic_curve.control_points.tolist()
+        assert [[3., 4.], [5., 6.]] == other.control_points.tolist()
+
+        basic_curve.release()
+        assert 1 == len(other.store)
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+import document
+from curve import Curve
+from store import CurveStore
+
+
+@pytest.fixture
+def curves():
+    store = CurveStore()
+    return [Curve(control_points=[[0, 0], [10, 20], [30, 0]], weights=[1., 2., 1.], curve_color=1, points_color=2,
+                  hull_color=3, size=4, hull_selection=False, store=store),
+            Curve(control_points=[[5, 5]], store=store),
+            Curve(store=store)]
+
+
+def test_round_trip(tmpdir, curves):
+    file_name = str(tmpdir.join('doc.bez'))
+    curves[0].bounding_box()
+    document.save(file_name, curves)
+    store, loaded = document.load(file_name, tolerance=.5)
+
+    assert 3 == len(store)
+    for c, l in zip(curves, loaded):
+        assert c.control_points.tolist() == l.control_points.tolist()
+        assert c.weights.tolist() == l.weights.tolist()
+        assert (c.size, c.hull_selection) == (l.size, l.hull_selection)
+    assert (1, 2, 3) == (loaded[0].curve_color, loaded[0].points_color, loaded[0].hull_color)
+    assert curves[0].bounding_box() == loaded[0].bounds
+    assert loaded[1].bounds is None
+    assert not loaded[0].computed
+    assert .5 == loaded[0].tolerance
+    assert loaded[0].bounds == loaded[0].copy(store=CurveStore()).bounds
+
+
+def test_loaded_curves_are_editable(tmpdir, curves):
+    file_name = str(tmpdir.join('doc.bez'))
+    document.save(file_name, curves)
+    _, loaded = document.load(file_name)
+
+    loaded[0].compute()
+    loaded[0].change(1, p=(0, 0))
+    loaded[1].append((6, 6))
+    loaded[2].append((7, 7))
+    assert [[0, 0], [0, 0], [30, 0]] == loaded[0].control_points.tolist()
+    assert [[5, 5], [6, 6]] == loaded[1].control_points.tolist()
+    assert [[7, 7]] == loaded[2].control_points.tolist()
+
+    _, reloaded = document.load(file_name)  # edits stay in memory
+    assert [[0, 0], [10, 20], [30, 0]] == reloaded[0].control_points.tolist()
+
+    document.save(file_name, loaded)  # over the mapped file
+    assert [[5, 5], [6, 6]] == loaded[1].control_points.tolist()
+    _, reloaded = document.load(file_name)
+    assert [[0, 0], [0, 0], [30, 0]] == reloaded[0].control_points.tolist()
+
+
+def test_rejects_other_files(tmpdir):
+    file_name = tmpdir.join('doc.csv')
+    file_name.write('0,1,2\n')
+    with pytest.raises(ValueError):
+        document.load(str(file_name))
@@ -0,0 +1,32 @@
+import numpy as np
+from curve import evaluate_curves
+from parallel import EvaluationPool, shards
+
+
+def random_curves(count):
+    rng = np.random.RandomState(0)
+    control_points = [rng.rand(rng.randint(1, 7), 2) * 100 for _ in xrange(count)]
+    return control_points, [rng.rand(len(p)) + .5 for p in control_points]
+
+
+def test_shards_cover_all_curves():
+    bounds = shards(np.array([1, 5, 5, 1, 1, 1, 10]), 3)
+    assert 0 == bounds[0][0] and 7 == bounds[-1][1]
+    assert all(stop == start for (_, stop), (start, _) in zip(bounds, bounds[1:]))
+
+
+def test_parallel_matches_sequential():
+    control_points, weights = random_curves(50)
+    pool = EvaluationPool(2)
+    try:
+        results = [(evaluate_curves(control_points, weights, tolerance, n=20, spacing=spacing),
+                    pool.evaluate(control_points, weights, tolerance, n=20, spacing=spacing))
+                   for tolerance, spacing in ((.5, None), (None, None), (None, 5.))]
+    finally:
+        pool.close()
+    for expected, result in results:
+        assert len(expected) == len(result)
+        for (t0, p0), (t1, p1) in zip(expected, result):
+            if len(p0) > 1:
+                np.testing.assert_array_almost_equal(t0, t1)
+            np.testing.assert_array_almost_equal(p0, p1)
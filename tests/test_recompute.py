@@ -0,0 +1,110 @@
+import threading
+import time
+import numpy as np
+import recompute
+from curve import Curve
+from recompute import RecomputeWorker
+
+
+def collect():
+    results, ready = [], threading.Event()
+
+    def on_result(batch):
+        results.extend(batch)
+        ready.set()
+    return results, ready, on_result
+
+
+def test_deferred_compute_marks_stale():
+    c = Curve(control_points=[[0, 0], [10, 20], [30, 0]], deferred=True)
+    assert c.stale
+    c.set_curve_points(np.linspace(0, 1, 3), np.zeros((3, 2)))
+    assert not c.stale
+
+
+def test_deferred_compute_keeps_center():
+    c = Curve(control_points=[[0, 0], [10, 20], [30, 0]], deferred=True)
+    np.testing.assert_array_equal([15, 10], c.center)
+    c.change(2, p=[50, 0])
+    np.testing.assert_array_equal([25, 10], c.center)
+    c.pop(0)
+    c.pop(0)
+    np.testing.assert_array_equal([50, 0], c.center)
+    c.pop(0)
+    assert [] == c.center
+
+
+def test_worker_threads_start_with_the_first_job():
+    results, ready, on_result = collect()
+    worker = RecomputeWorker(on_result, threads=1)
+    worker.submit([Curve(control_points=[[0, 0]])])  # nothing to evaluate
+    assert not any(thread.is_alive() for thread in worker.threads)
+
+    worker.submit([Curve(control_points=[[0, 0], [10, 20]], deferred=True)])
+    assert all(thread.is_alive() for thread in worker.threads)
+    assert ready.wait(5)
+
+
+def test_worker_delivers_current_samples():
+    results, ready, on_result = collect()
+    worker = RecomputeWorker(on_result, threads=1)
+    c = Curve(control_points=[[0, 0], [10, 20], [30, 0]], tolerance=.1, deferred=True)
+
+    worker.submit([c])
+    worker.submit([c])  # already queued for this version
+    assert ready.wait(5)
+    [(curve, version, t, curve_points)] = results
+    assert curve is c and worker.is_current(c, version)
+    np.testing.assert_array_almost_equal(curve_points[[0, -1]], [[0, 0], [30, 0]])
+
+    worker.done(c, version)
+    assert not worker.is_current(c, version)
+
+
+def test_worker_result_is_stale_after_change(monkeypatch):
+    results, ready, on_result = collect()
+    worker = RecomputeWorker(on_result, threads=1)
+    c = Curve(control_points=[[0, 0], [10, 20], [30, 0]], tolerance=.1, deferred=True)
+
+    entered, gate = threading.Event(), threading.Event()
+    evaluate_curves = recompute.evaluate_curves
+
+    def gated(*args, **kwargs):
+        entered.set()
+        assert gate.wait(5)
+        return evaluate_curves(*args, **kwargs)
+    monkeypatch.setattr(recompute, 'evaluate_curves', gated)
+    worker.submit([c])
+    assert entered.wait(5)
+    c.change(1, p=[10, 30])
+    gate.set()
+
+    assert ready.wait(5)
+    [(curve, version, _, curve_points)] = results
+    assert curve is c and not worker.is_current(c, version)
+    np.testing.assert_array_almost_equal([[0, 0], [30, 0]], curve_points[[0, -1]])
+
+
+def test_failed_job_can_be_submitted_again(monkeypatch):
+    results, ready, on_result = collect()
+    worker = RecomputeWorker(on_result, threads=1)
+    c = Curve(control_points=[[0, 0], [10, 20], [30, 0]], tolerance=.1, deferred=True)
+
+    failed = threading.Event()
+
+    def fail(*args, **kwargs):
+        failed.set()
+        raise ValueError('broken')
+    monkeypatch.setattr(recompute, 'evaluate_curves', fail)
+    monkeypatch.setattr(recompute.traceback, 'print_exc', lambda: None)
+    worker.submit([c])
+    assert failed.wait(5)
+    monkeypatch.undo()
+
+    for _ in xrange(500):
+        if c not in worker.latest:
+            break
+        time.sleep(.01)
+    worker.submit([c])
+    assert ready.wait(5)
+    assert worker.is_current(c, results[0][1])
@@ -0,0 +1,104 @@
+from spatial import GridIndex, ControlPointIndex, EndpointIndex
+from curve import Curve
+
+
+def test_grid_nearest_within_radius():
+    grid = GridIndex(cell=10)
+    grid.insert('a', (5, 5))
+    grid.insert('b', (25, 5))
+    grid.insert('c', (-3, -3))
+
+    assert ('a', 8.) == grid.nearest((7, 7), radius=5)
+    assert (None, float('inf')) == grid.nearest((50, 50), radius=5)
+    assert 'c' == grid.nearest((0, 0), radius=5, accept=lambda key: key != 'a')[0]
+
+
+def test_grid_move_and_remove():
+    grid = GridIndex(cell=10)
+    grid.insert('a', (5, 5))
+    grid.move('a', (95, 95))
+    assert grid.nearest((5, 5), radius=5)[0] is None
+    assert 'a' == grid.nearest((95, 95), radius=5)[0]
+
+    grid.remove('a')
+    assert 0 == len(grid)
+    assert {} == grid.cells
+
+
+def test_control_point_index_follows_curves():
+    index = ControlPointIndex(cell=10)
+    first = Curve(control_points=[[0, 0], [50, 50]], compute=False)
+    second = Curve(control_points=[[100, 0], [150, 50]], compute=False)
+    index.add_curve(first)
+    index.add_curve(second)
+
+    assert (second, 1) == index.nearest((148, 52), radius=5)[0]
+
+    first.append((200, 200))
+    assert (first, 2) == index.nearest((201, 201), radius=5)[0]
+
+    first.change(0, p=(300, 300))
+    assert index.nearest((0, 0), radius=5)[0] is None
+    assert (first, 0) == index.nearest((300, 300), radius=5)[0]
+
+    second.pop(0)
+    assert (second, 0) == index.nearest((150, 50), radius=5)[0]
+    assert index.nearest((100, 0), radius=5)[0] is None
+
+    index.remove_curve(second)
+    assert index.nearest((150, 50), radius=5)[0] is None
+    assert 3 == len(index)
+
+
+def test_endpoint_index_finds_foreign_ends():
+    index = EndpointIndex(cell=10)
+    first = Curve(control_points=[[0, 0], [50, 50], [100, 0]], compute=False)
+    second = Curve(control_points=[[105, 3], [150, 50]], compute=False)
+    index.add_curve(first)
+    index.add_curve(second)
+
+    assert ((second, 0), -1) == index.nearest_foreign(first, radius=20)
+    assert ((first, -1), 0) == index.nearest_foreign(second, radius=20)
+
+    second.change(0, p=(300, 300))
+    assert index.nearest_foreign(first, radius=20) is None
+
+    index.remove_curve(second)
+    assert 2 == len(index)
+
+
+def test_endpoint_index_sees_pending_transform():
+    index = EndpointIndex(cell=10)
+    first = Curve(control_points=[[0, 0], [50, 50], [100, 0]], compute=False)
+    second = Curve(control_points=[[200, 0], [250, 50]], compute=False)
+    index.add_curve(first)
+    index.add_curve(second)
+
+    first.translate(-95, 0)
+    assert ((second, 0), -1) == index.nearest_foreign(first, radius=20)
+    assert index.nearest_foreign(second, radius=20) is None
+
+    first.apply_transform()
+    assert ((first, -1), 0) == index.nearest_foreign(second, radius=20)
+
+
+def test_curves_with_bounds_are_indexed_on_first_query():
+    index = ControlPointIndex(cell=10)
+    near = Curve(control_points=[[0, 0], [20, 20]], compute=False)
+    far = Curve(control_points=[[500, 500], [520, 520]], compute=False)
+    wide = Curve(control_points=[[0, 300], [900, 300]], compute=False)
+    for c in (near, far, wide):
+        c.bounding_box()
+        index.add_curve(c)
+    assert 0 == len(index)
+
+    assert (near, 1) == index.nearest((21, 21), radius=5)[0]
+    assert 2 == len(index) and far in index.pending and wide in index.pending
+    assert (wide, 1) == index.nearest((899, 301), radius=5)[0]
+    assert wide not in index.pending
+
+    far.change(0, p=(400, 400))
+    assert far not in index.pending
+    assert (far, 0) == index.nearest((400, 400), radius=5)[0]
+    index.remove_curve(far)
+    assert 4 == len(index)
@@ -0,0 +1,35 @@
+import sys
+from StringIO import StringIO
+from startup import StartupTimings
+
+
+def test_import_self_times(tmpdir, monkeypatch):
+    tmpdir.join('startup_outer.py').write('import time\nimport startup_inner\ntime.sleep(.02)\n')
+    tmpdir.join('startup_inner.py').write('import time\ntime.sleep(.05)\n')
+    monkeypatch.syspath_prepend(str(tmpdir))
+    timings = StartupTimings()
+    timings.enable()
+    try:
+        import startup_outer
+    finally:
+        timings.disable()
+        sys.modules.pop('startup_outer', None)
+        sys.modules.pop('startup_inner', None)
+
+    own = dict((name, seconds) for kind, name, seconds in timings.records)
+    assert .05 <= own['startup_inner']
+    assert .02 <= own['startup_outer'] < .05
+
+
+def test_measure_and_report():
+    timings = StartupTimings()
+    with timings.measure('widget', 'ignored'):
+        pass
+    assert [] == timings.records
+
+    timings.enabled = True
+    with timings.measure('widget', 'palette'):
+        pass
+    out = StringIO()
+    timings.report(out)
+    assert 'palette' in out.getvalue()
@@ -3,7 +3,7 @@
 import os
 from PyQt4 import QtGui, QtCore
 from PyQt4.QtCore import Qt, QString
-from PyQt4.QtGui import QTableWidget, QTableWidgetItem
+from startup import timings
 
 
 THEME = "algae"
@@ -68,22 +68,30 @@ class ToolProperties(QtGui.QDockWidget):
         self.setAllowedAreas(Qt.RightDockWidgetArea)
         self.setFeatures(QtGui.QDockWidget.NoDockWidgetFeatures)
 
-        self.widgets = self.create_widgets()
+        self.factories = self.create_widgets()
+        self.widgets = {}  # tool -> property widget, built on first use
         self.signals.update_tool.connect(self.update_widget)
 
         self.update_widget()
 
     def create_widgets(self):
-        return [QtGui.QWidget(),
-                self.create_pencil_widget(),
-                QtGui.QWidget(),
-                QtGui.QWidget(),
-                QtGui.QWidget(),
-                self.create_join_widget(),
-                QtGui.QWidget(),
-                QtGui.QWidget(),
-                QtGui.QWidget(),
-                QtGui.QWidget()]
+        """Factories of the property widget of every tool, see get_widget."""
+        return [QtGui.QWidget,
+                self.create_pencil_widget,
+                QtGui.QWidget,
+                QtGui.QWidget,
+                QtGui.QWidget,
+                self.create_join_widget,
+                QtGui.QWidget,
+                QtGui.QWidget,
+                QtGui.QWidget,
+                QtGui.QWidget]
+
+    def get_widget(self, tool):
+        if tool not in self.widgets:
+            with timings.measure('widget', 'tool properties: {}'.format(Tools.d[tool][0])):
+                self.widgets[tool] = self.factories[tool]()
+        return self.widgets[tool]
 
     def create_size_widget(self, context, signal, slider_value=1):
         widget = QtGui.QWidget()
@@ -139,12 +147,12 @@ class ToolProperties(QtGui.QDockWidget):
         return widget
 
     def update_widget(self):
-        self.setWidget(self.widgets[self.context.current_tool])
+        self.setWidget(self.get_widget(self.context.current_tool))
 
 
 class CurveProperties(QtGui.QDockWidget):
 
-    def __init__(self, title, context, signals, parent=None):
+    def __init__(self, title, context, signals, curves, parent=None):
 
         super(CurveProperties, self).__init__(title, parent)
 
@@ -153,6 +161,7 @@ class CurveProperties(QtGui.QDockWidget):
         self.parent = parent
         self.setAllowedAreas(Qt.RightDockWidgetArea)
         self.setFeatures(QtGui.QDockWidget.NoDockWidgetFeatures)
+        self.curves = curves
 
         self.setWidget(self.create_global_widget())
 
@@ -170,47 +179,115 @@ class CurveProperties(QtGui.QDockWidget):
 
         weights = self.create_weights_widget()
 
+        spacing = QtGui.QDoubleSpinBox(self)
+        spacing.setPrefix("sample spacing ")
+        spacing.setSuffix(" px")
+        spacing.setSpecialValueText("adaptive sampling")
+        spacing.setRange(0, 100)
+        spacing.setValue(self.context.sample_spacing or 0)
+        spacing.valueChanged.connect(self.context.set_sample_spacing)
+
         vbox.setAlignment(QtCore.Qt.AlignTop)
         vbox.addWidget(hull)
+        vbox.addWidget(spacing)
         vbox.addWidget(weights)
 
         widget.setLayout(vbox)
         return widget
 
     def create_weights_widget(self):
-        def add_item():
-            row = table_widget.rowCount()
-            item = QTableWidgetItem()
-            item.setData(Qt.EditRole, 1.)
-            table_widget.insertRow(row)
-            table_widget.setItem(row, 0, item)
-
-        def change_all_rows(new_rows):
-            for i in xrange(table_widget.rowCount(), -1, -1):
-                table_widget.removeRow(i)
-            for i, value in enumerate(new_rows):
-                item = QTableWidgetItem()
-                item.setData(Qt.EditRole, value)
-                table_widget.insertRow(i)
-                table_widget.setItem(i, 0, item)
-
-        def change_item(x, y):
-            val = float(table_widget.item(x, y).text())
-            self.signals.change_weight.emit(x, val)
-
-        table_widget = QTableWidget(0, 1)
-        table_widget.verticalHeader().setDefaultSectionSize(20)
-        table_widget.setHorizontalHeaderLabels([QString("weights")])
-        self.signals.new_point.connect(add_item)
-        self.signals.delete_point.connect(table_widget.removeRow)
-        self.signals.change_weights.connect(change_all_rows)
-        table_widget.cellChanged.connect(change_item)
-        return table_widget
+        def change_curve():
+            index = self.context.current_curve
+            model.set_curve(self.curves[index] if index is not None else None)
+
+        model = WeightsModel(self)
+        table_view = QtGui.QTableView()
+        table_view.verticalHeader().setDefaultSectionSize(20)
+        table_view.horizontalHeader().setStretchLastSection(True)
+        table_view.setModel(model)
+        self.signals.change_curve.connect(change_curve)
+        return table_view
+
+
+class WeightsModel(QtCore.QAbstractTableModel):
+    """Weights of one curve, read straight from its weights array. The model
+    follows the curve as its observer, edits are collected and applied together
+    once control returns to the event loop. The curve notifies after points were
+    added or removed, so rows keeps the count the views know until a reset."""
+
+    def __init__(self, parent=None):
+        super(WeightsModel, self).__init__(parent)
+        self.curve = None
+        self.rows = 0
+        self.pending = {}  # row -> weight not yet passed to the curve
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.apply_edits)
+
+    def set_curve(self, curve):
+        if curve is self.curve:
+            return
+        self.apply_edits()
+        self.beginResetModel()
+        if self.curve is not None:
+            self.curve.unsubscribe(self.curve_changed)
+        self.curve = curve
+        if curve is not None:
+            curve.subscribe(self.curve_changed)
+        self.rows = len(curve.weights) if curve is not None else 0
+        self.endResetModel()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else self.rows
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else 1
+
+    def data(self, index, role=Qt.DisplayRole):
+        if index.isValid() and role in (Qt.DisplayRole, Qt.EditRole):
+            row = index.row()
+            return QtCore.QVariant(self.pending.get(row, float(self.curve.weights[row])))
+        return QtCore.QVariant()
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return QtCore.QVariant(QString("weights"))
+        return super(WeightsModel, self).headerData(section, orientation, role)
+
+    def flags(self, index):
+        return super(WeightsModel, self).flags(index) | Qt.ItemIsEditable
+
+    def setData(self, index, value, role=Qt.EditRole):
+        weight, ok = value.toDouble()
+        if not index.isValid() or role != Qt.EditRole or not ok or not weight:
+            return False
+        self.pending[index.row()] = weight
+        self.timer.start(0)
+        self.dataChanged.emit(index, index)
+        return True
+
+    def apply_edits(self):
+        self.timer.stop()
+        pending, self.pending = self.pending, {}
+        if pending and self.curve is not None:
+            self.curve.change_weights(pending)
+
+    def curve_changed(self, curve, event, i=None):
+        if event == 'change':
+            index = self.index(i, 0)
+            self.dataChanged.emit(index, index)
+            return
+        elif event == 'transform':
+            return
+        self.pending.clear()  # rows of pending edits may have moved
+        self.beginResetModel()
+        self.rows = len(curve.weights)
+        self.endResetModel()
 
 
 class CurveSelector(QtGui.QDockWidget):
 
-    def __init__(self, title, context, signals, parent=None):
+    def __init__(self, title, context, signals, curves, parent=None):
 
         super(CurveSelector, self).__init__(title, parent)
 
@@ -219,7 +296,7 @@ class CurveSelector(QtGui.QDockWidget):
         self.parent = parent
         self.setAllowedAreas(Qt.RightDockWidgetArea)
         self.setFeatures(QtGui.QDockWidget.NoDockWidgetFeatures)
-        self.max = 0
+        self.curves = curves
         self.setWidget(self.create_list_widget())
 
     def create_list_widget(self):
@@ -230,9 +307,10 @@ class CurveSelector(QtGui.QDockWidget):
         vbox = QtGui.QVBoxLayout()
         hbox = QtGui.QHBoxLayout()
 
-        curve_list = CurveList(self.context, self.signals)
-        curve_list.itemClicked.connect(self.context.set_current_curve)
-        self.signals.add_curve_to_widget.connect(curve_list.add_to_widget)
+        curve_list = CurveList(self.context, self.signals, CurveListModel(self.curves, self))
+        curve_list.clicked.connect(lambda index: self.context.set_current_curve(index.row()))
+        self.signals.curves_added.connect(curve_list.model().insert_curves)
+        self.signals.select_curve.connect(curve_list.select_row)
 
         button_add = QtGui.QPushButton('Add', self)
         button_add.clicked.connect(curve_list.add_item)
@@ -250,35 +328,52 @@ class CurveSelector(QtGui.QDockWidget):
         return widget
 
 
-class CurveList(QtGui.QListWidget):
-    def __init__(self, context, signals):
+class CurveListModel(QtCore.QAbstractListModel):
+    """One row per curve of the canvas, the row is the index of the curve.
+    Rows follow the list of curves through insert_curves and reset."""
+
+    def __init__(self, curves, parent=None):
+        super(CurveListModel, self).__init__(parent)
+        self.curves = curves
+        self.rows = len(curves)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else self.rows
+
+    def data(self, index, role=Qt.DisplayRole):
+        if index.isValid() and role == Qt.DisplayRole:
+            return QtCore.QVariant('curve {}'.format(index.row()))
+        if index.isValid() and role == Qt.ToolTipRole:
+            return QtCore.QVariant('{} points'.format(len(self.curves[index.row()].control_points)))
+        return QtCore.QVariant()
+
+    def insert_curves(self, first, count):
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + count - 1)
+        self.rows += count
+        self.endInsertRows()
+
+    def reset_rows(self):
+        self.beginResetModel()
+        self.rows = len(self.curves)
+        self.endResetModel()
+
+
+class CurveList(QtGui.QListView):
+    def __init__(self, context, signals, model):
         super(CurveList, self).__init__()
         self.context = context
         self.signals = signals
+        self.setUniformItemSizes(True)
+        self.setModel(model)
 
     def add_item(self):
-        self.addItem(ListItem('curve {}'.format(len(self)), len(self)))
         self.signals.add_curve_to_backend.emit()
 
-    def add_to_widget(self):
-        self.addItem(ListItem('curve {}'.format(len(self)), len(self)))
+    def select_row(self, row):
+        self.setCurrentIndex(self.model().index(row))
 
     def remove_item(self):
-        curves_to_remove = []
-        for selected_item in self.selectedItems():
-            self.takeItem(self.row(selected_item))
-            curves_to_remove.append(selected_item.index)
-        for i in range(self.count()):
-            item = self.item(i)
-            item.index = i
+        curves_to_remove = [index.row() for index in self.selectedIndexes()]
         self.signals.delete_curves.emit(curves_to_remove)
-        if self.selectedItems():
-            self.context.set_current_curve(self.selectedItems()[0])
-        else:
-            self.context.set_current_curve(None)
-
-
-class ListItem(QtGui.QListWidgetItem):
-    def __init__(self, name, index):
-        super(ListItem, self).__init__(name)
-        self.index = index
+        self.model().reset_rows()
+        self.context.set_current_curve(None)